@@ -0,0 +1,91 @@
+"""The parts of Krita's scripting API the plugin uses, enough to run it
+offscreen in the tests. Like the real module it re-exports os, sys and
+PyQt5."""
+import os
+import sys
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+
+class Extension(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+
+class Notifier(QObject):
+    windowCreated = pyqtSignal()
+
+
+class Window(QObject):
+    def __init__(self, qwin):
+        super().__init__()
+        self.qwin = qwin
+
+    def qwindow(self):
+        return self.qwin
+
+    def createAction(self, name, text, menu):
+        action = QAction(text, self.qwin)
+        action.setObjectName(name)
+        Krita.instance().addAction(action)
+        return action
+
+    def dockers(self):
+        return self.qwin.findChildren(QDockWidget)
+
+
+class Krita(QObject):
+    _instance = None
+
+    def __init__(self):
+        super().__init__()
+        self.settings = {}
+        self.actionsByName = {}
+        self.extensions = []
+        self.windows = []
+        self.notifierObject = Notifier()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = Krita()
+        return cls._instance
+
+    def addAction(self, action):
+        self.actionsByName[action.objectName()] = action
+
+    def readSetting(self, group, name, default):
+        return self.settings.get((group, name), default)
+
+    def writeSetting(self, group, name, value):
+        self.settings[(group, name)] = value
+
+    def actions(self):
+        return [ action for action in self.actionsByName.values() if not sip.isdeleted(action) ]
+
+    def action(self, name):
+        action = self.actionsByName.get(name)
+        return action if action is not None and not sip.isdeleted(action) else None
+
+    def icon(self, name):
+        return QIcon()
+
+    def notifier(self):
+        return self.notifierObject
+
+    def version(self):
+        return '5.2.0'
+
+    def addExtension(self, extension):
+        self.extensions.append(extension)
+
+    def activeWindow(self):
+        return self.windows[-1] if self.windows else None
+
+    def dockers(self):
+        return []
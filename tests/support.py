@@ -0,0 +1,95 @@
+"""Offscreen set up shared by the tests: the krita stub next to this file,
+a QApplication and the plugin package, with its settings in a scratch
+directory."""
+import os
+import sys
+import json
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['XDG_CONFIG_HOME'] = tempfile.mkdtemp(prefix='toolbarui-tests-')
+os.environ['XDG_CACHE_HOME'] = os.environ['XDG_RUNTIME_DIR'] = os.environ['XDG_CONFIG_HOME']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ HERE, os.path.join(os.path.dirname(HERE), 'toolbarui') ]
+
+from PyQt5.QtCore import qInstallMessageHandler
+from PyQt5.QtWidgets import QApplication, QAction, QMainWindow
+
+def messages(kind, context, message):
+    # the offscreen platform can't grab or raise, popups ask it to
+    if not message.startswith('This plugin does not support'):
+        sys.stderr.write(message + '\n')
+
+qInstallMessageHandler(messages)
+app = QApplication.instance() or QApplication([])
+
+from krita import Krita, Window
+
+
+def action(name, checkable=False):
+    a = Krita.instance().action(name)
+    if a is None:
+        a = QAction(name)
+        a.setObjectName(name)
+        a.setToolTip('tip ' + name)
+        a.setCheckable(checkable)
+        Krita.instance().addAction(a)
+    return a
+
+
+def item(uuid, actions, openBy='left'):
+    return {
+        'uuid':uuid,
+        'alias':'Item ' + uuid,
+        'reactions':[{
+            'alias':'r',
+            'uuid':'r' + uuid,
+            'actions':[ { 'name':name, 'icon':'' } for name in actions ],
+            'dockers':[],
+            'config':{ 'reactionTypeCmb':'Action Collection', 'reactionOpenByCmb':openBy }
+            }]
+        }
+
+
+def toolbar(name, top, bottom=()):
+    return { 'config':{ 'toolbarName':name }, 'top':{ 'items':list(top) }, 'bottom':{ 'items':list(bottom) } }
+
+
+def settings(toolbars):
+    return { 'version':0, 'count':0, 'config':{}, 'toolbars':dict(toolbars) }
+
+
+# what the plugin finds in the Krita settings when it loads: one toolbar
+# of twenty items, in the unversioned layout of older releases
+SETTINGS = settings({ 't1':toolbar('One', [ item('i%d' % i, ['abcde'[i % 5]]) for i in range(20) ], [ item('x', ['c', 'd']) ]) })
+for name in 'abcde':
+    action(name, name == 'c')
+Krita.instance().writeSetting('', 'pluginToolBarUI', json.dumps(SETTINGS))
+
+import ToolBarUI
+
+extension = Krita.instance().extensions[0]
+
+
+def openWindow():
+    """A new main window with the plugin set up in it, its toolbars built."""
+    qwin = QMainWindow()
+    window = Window(qwin)
+    Krita.instance().windows.append(window)
+    extension.createActions(window)
+    Krita.instance().notifier().windowCreated.emit()
+    idle()
+    return qwin
+
+
+def idle():
+    while len(extension.idle):
+        app.processEvents()
+    app.processEvents()
+
+
+def edit(func):
+    """Runs func(settings, journal) as a dialog session that is accepted."""
+    extension.writeSettings(lambda: func(extension.tempSettings, extension.journal) or True)
+    idle()
@@ -0,0 +1,65 @@
+"""Events per second a bound toolbar button handles. Runs offscreen, also
+on its own: python tests/test_buttons.py"""
+import time
+import unittest
+
+import support
+from support import extension
+from PyQt5.QtCore import Qt, QEvent, QPointF
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtTest import QSignalSpy
+
+
+class ButtonEventBenchmark(unittest.TestCase):
+    """Presses and hovers go through the button's dispatch table, with the
+    actions resolved when it was bound. The limits leave room for slow
+    machines, typically a button takes several times more."""
+    EVENTS = 5000
+    PRESSES = 20000
+    HOVERS = 10000
+
+    def setUp(self):
+        hover = support.item('hover', ['a', 'b'], 'hover')
+        hover['reactions'][0]['config']['intReactionOpenTimeout'] = 300
+        support.edit(lambda s, j: j.append(s['toolbars']['t1']['top']['items'], hover, 't1'))
+        self.qwin = support.openWindow()
+        self.toolbar = extension.windows[self.qwin]['t1']
+
+    def tearDown(self):
+        self.qwin.deleteLater()
+        support.idle()
+        support.edit(lambda s, j: j.pop(s['toolbars']['t1']['top']['items'], -1, 't1'))
+
+    def rate(self, button, events):
+        lookups = extension.windowActions.stats['lookups']
+        start = time.perf_counter()
+        for i in range(self.EVENTS):
+            for event in events:
+                QApplication.sendEvent(button, event)
+        rate = self.EVENTS * len(events) / (time.perf_counter() - start)
+        # nothing is looked up once the button is bound
+        self.assertEqual(extension.windowActions.stats['lookups'], lookups)
+        return rate
+
+    def test_presses(self):
+        button = self.toolbar.items['top'][0]
+        triggered = QSignalSpy(extension.windowActions.action(self.qwin, 'a').triggered)
+        press = QMouseEvent(QEvent.MouseButtonPress, QPointF(2, 2), Qt.LeftButton, Qt.LeftButton, Qt.NoModifier)
+        self.assertGreater(self.rate(button, [ press ]), self.PRESSES)
+        self.assertEqual(len(triggered), self.EVENTS)
+
+    def test_hovers(self):
+        button = self.toolbar.items['top'][-1]
+        self.assertEqual(button.s.uuid, 'hover')
+        wheel = extension.timers.wheel
+        (scheduled, fired) = (wheel.stats['scheduled'], wheel.stats['fired'])
+        self.assertGreater(self.rate(button, [ QEvent(QEvent.Enter), QEvent(QEvent.Leave) ]), self.HOVERS)
+        # every enter was cancelled by its leave before the open delay
+        self.assertEqual(wheel.stats['scheduled'] - scheduled, self.EVENTS)
+        self.assertEqual(wheel.stats['fired'], fired)
+        self.assertIsNone(button.popup)
+
+
+if __name__ == '__main__':
+    unittest.main()
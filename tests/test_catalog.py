@@ -0,0 +1,141 @@
+"""The icon catalog, read from its cache or scanned from a resource tree
+shaped like Krita's, and the action catalog behind the action picker."""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import support
+from support import extension
+from krita import Krita
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+from PyQt5.pyrcc_main import processResourceFile
+from ToolBarUI.ToolBarUICatalog import IconCatalog, ActionCatalog, ICONS_KRITA, ICONS_KRITA_EXTRA, ICONS_THEME
+
+
+THEME_FILE = os.path.join(os.path.dirname(support.HERE), 'toolbarui', 'ToolBarUI', 'ThemeIcons.txt')
+
+
+class IconCatalogTest(unittest.TestCase):
+    # about what a Krita build ships in :/pics/ and :/icons/
+    ICONS = 1500
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp(prefix='toolbarui-icons-')
+        files = { 'pics':[], 'icons':[] }
+        for i in range(cls.ICONS):
+            if i % 5:
+                (prefix, name) = ('pics', '%s_%s_icon%d.svg' % ('16 22 32'.split()[i % 3], ('light', 'dark')[i % 2], i))
+            else:
+                (prefix, name) = ('icons', 'extra%d.png' % i)
+            os.makedirs(os.path.join(cls.dir, prefix), exist_ok=True)
+            with open(os.path.join(cls.dir, prefix, name), 'w') as f:
+                f.write('<svg/>')
+            files[prefix].append(prefix + '/' + name)
+
+        qrc = os.path.join(cls.dir, 'icons.qrc')
+        with open(qrc, 'w') as f:
+            f.write('<RCC>')
+            for (prefix, names) in files.items():
+                f.write('<qresource prefix="/%s">' % prefix)
+                f.write(''.join( '<file alias="%s">%s</file>' % (n.split('/')[1], n) for n in names ))
+                f.write('</qresource>')
+            f.write('</RCC>')
+        processResourceFile([qrc], qrc + '.py', False)
+        # the module keeps the registered data alive
+        cls.resources = {}
+        with open(qrc + '.py') as f:
+            exec(f.read(), cls.resources)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.resources['qCleanupResources']()
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        shutil.rmtree(os.path.join(self.dir, 'cache'), ignore_errors=True)
+
+    def catalog(self, pluginVersion='1'):
+        return IconCatalog('5.2.0', pluginVersion, THEME_FILE, os.path.join(self.dir, 'cache', 'icons.json'))
+
+    def loadTime(self):
+        catalog = self.catalog()
+        catalog.load()
+        return catalog.stats['time']
+
+    def scanTime(self, catalog):
+        start = time.perf_counter()
+        catalog.scan()
+        return time.perf_counter() - start
+
+    def test_cached_load_is_cheaper_than_a_scan(self):
+        scanned = self.catalog()
+        scanned.load()
+        self.assertEqual(scanned.stats['source'], 'scan')
+
+        cached = self.catalog()
+        cached.load()
+        self.assertEqual(cached.stats['source'], 'cache')
+        self.assertEqual(cached.icons, scanned.icons)
+        self.assertEqual(len(cached.names(ICONS_KRITA | ICONS_KRITA_EXTRA)), self.ICONS)
+        self.assertIn('icon1', cached.names(ICONS_KRITA))
+        self.assertTrue(cached.names(ICONS_THEME))
+
+        # best of a few runs, a collection or a busy machine can stall one
+        load = min( self.loadTime() for i in range(5) )
+        scan = min( self.scanTime(scanned) for i in range(5) )
+        self.assertLess(load, scan / 2)
+
+    def test_a_new_plugin_version_scans_again(self):
+        self.catalog().load()
+        catalog = self.catalog('2')
+        catalog.load()
+        self.assertEqual(catalog.stats['source'], 'scan')
+
+
+class ActionCatalogBenchmark(unittest.TestCase):
+    """Opening the action picker of a full Krita, about 1600 actions. The
+    catalog is built once, an opening only resets the shared model; the
+    first one also indexes the actions for the filter."""
+    ACTIONS = 1600
+    OPENS = 20
+
+    @classmethod
+    def setUpClass(cls):
+        cls.names = [ 'bench_action_%d' % i for i in range(cls.ACTIONS) ]
+        for name in cls.names:
+            support.action(name)
+        extension.actionCatalog.refresh()
+
+    @classmethod
+    def tearDownClass(cls):
+        for name in cls.names:
+            Krita.instance().actionsByName.pop(name).deleteLater()
+        support.idle()
+        extension.actionCatalog.refresh()
+
+    def openPicker(self):
+        QTimer.singleShot(0, lambda: QApplication.activeModalWidget().reject())
+        start = time.perf_counter()
+        extension.getAction()
+        return time.perf_counter() - start
+
+    def test_picker_opens_reuse_the_catalog(self):
+        catalog = ActionCatalog(Krita.instance())
+        catalog.load()
+        self.assertGreaterEqual(len(catalog), self.ACTIONS)
+        build = catalog.stats['buildTime']
+
+        builds = extension.actionCatalog.stats['builds']
+        self.openPicker()
+        opens = [ self.openPicker() for i in range(self.OPENS) ]
+        self.assertEqual(extension.actionCatalog.stats['builds'], builds)
+        self.assertEqual(extension.actionModel.rowCount(), len(extension.actionCatalog))
+        self.assertLess(sum(opens) / len(opens), build)
+
+
+if __name__ == '__main__':
+    unittest.main()
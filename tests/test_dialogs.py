@@ -0,0 +1,43 @@
+"""The dialog pool and the pickers built on it, offscreen."""
+import unittest
+
+import support
+from support import extension
+from krita import Krita
+from PyQt5.QtCore import QTimer, QCoreApplication, QEvent
+from PyQt5.QtWidgets import QApplication
+
+
+def closeModal(accept=False):
+    dlg = QApplication.activeModalWidget()
+    dlg.accept() if accept else dlg.reject()
+
+
+class DialogPoolTest(unittest.TestCase):
+
+    def test_a_pooled_dialog_outlives_its_window(self):
+        qwin = support.openWindow()
+        dlg = extension.dialog('ActionPicker')
+        extension.releaseDialog(dlg)
+
+        Krita.instance().windows.pop()
+        qwin.deleteLater()
+        support.idle()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+        self.assertIs(extension.dialog('ActionPicker'), dlg)
+        extension.releaseDialog(dlg)
+
+    def test_cancelled_pickers_return_nothing_and_are_released(self):
+        for (picker, name) in ((extension.getAction, 'ActionPicker'), (extension.getIcon, 'IconPicker')):
+            QTimer.singleShot(0, closeModal)
+            self.assertIsNone(picker())
+            free = len(extension.dialogs.free[name])
+            QTimer.singleShot(0, lambda: closeModal(True))
+            # accepted without a selection
+            self.assertIsNone(picker())
+            self.assertEqual(len(extension.dialogs.free[name]), free)
+
+
+if __name__ == '__main__':
+    unittest.main()
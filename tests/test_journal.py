@@ -0,0 +1,95 @@
+import unittest
+
+import support
+from ToolBarUI.ToolBarUIJournal import Journal, JournalError
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = { 'config':{ 'name':'a' }, 'items':[1, 2, 3] }
+        self.journal = Journal()
+        self.journal.begin()
+
+    def test_rollback_restores_every_mutation(self):
+        j = self.journal
+        j.set(self.tree['config'], 'name', 'b', 'config')
+        j.set(self.tree['config'], 'new', 1, 'config')
+        j.delete(self.tree, 'config')
+        j.insert(self.tree['items'], 0, 0, 't1')
+        j.append(self.tree['items'], 4, 't1')
+        j.pop(self.tree['items'], 1, 't1')
+        self.assertEqual(self.tree, { 'items':[0, 2, 3, 4] })
+        j.rollback()
+        self.assertEqual(self.tree, { 'config':{ 'name':'a' }, 'items':[1, 2, 3] })
+        self.assertEqual(j.depth(), 0)
+
+    def test_negative_indexes(self):
+        j = self.journal
+        j.insert(self.tree['items'], -1, 9)
+        self.assertEqual(j.pop(self.tree['items'], -2), 3)
+        self.assertEqual(self.tree['items'], [1, 2, 9])
+        j.rollback()
+        self.assertEqual(self.tree['items'], [1, 2, 3])
+
+    def test_undo_and_redo_steps(self):
+        j = self.journal
+        j.set(self.tree['config'], 'name', 'b')
+        j.append(self.tree['items'], 4)
+        self.assertTrue(j.undo())
+        self.assertEqual(self.tree['items'], [1, 2, 3])
+        self.assertTrue(j.undo())
+        self.assertEqual(self.tree['config']['name'], 'a')
+        self.assertFalse(j.undo())
+        self.assertTrue(j.redo())
+        self.assertEqual(self.tree['config']['name'], 'b')
+        # a new edit drops what could be redone
+        j.pop(self.tree['items'], 0)
+        self.assertFalse(j.canRedo())
+        self.assertEqual(self.tree, { 'config':{ 'name':'b' }, 'items':[2, 3] })
+
+    def test_nested_scope_is_one_step(self):
+        j = self.journal
+        j.begin()
+        j.append(self.tree['items'], 4)
+        j.append(self.tree['items'], 5)
+        self.assertFalse(j.canUndo())
+        j.commit()
+        self.assertTrue(j.undo())
+        self.assertEqual(self.tree['items'], [1, 2, 3])
+        self.assertFalse(j.canUndo())
+
+    def test_nested_rollback_keeps_the_session(self):
+        j = self.journal
+        j.append(self.tree['items'], 4)
+        j.begin()
+        j.append(self.tree['items'], 5)
+        j.rollback()
+        self.assertEqual(self.tree['items'], [1, 2, 3, 4])
+        self.assertTrue(j.canUndo())
+
+    def test_commit_hands_back_the_session(self):
+        j = self.journal
+        j.set(self.tree['config'], 'name', 'b', 'config')
+        j.append(self.tree['items'], 4, 't1')
+        j.undo()
+        j.append(self.tree['items'], 5, 't2')
+        self.assertEqual(j.tags(), { 'config', 't2' })
+        ops = j.commit()
+        self.assertEqual(len(ops), 2)
+        self.assertEqual(j.depth(), 0)
+        self.assertFalse(j.canUndo())
+        self.assertEqual(self.tree, { 'config':{ 'name':'b' }, 'items':[1, 2, 3, 5] })
+
+    def test_misuse_raises(self):
+        j = Journal()
+        self.assertRaises(JournalError, j.commit)
+        self.assertRaises(JournalError, j.rollback)
+        self.assertRaises(JournalError, j.set, self.tree, 'x', 1)
+        self.journal.begin()
+        self.assertRaises(JournalError, self.journal.undo)
+        self.assertRaises(JournalError, self.journal.redo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import copy
+import unittest
+
+import support
+from ToolBarUI.ToolBarUILayout import Layout, Toolbar, LayoutError
+
+
+def sample():
+    data = support.settings({
+        't1':support.toolbar('One', [ support.item('a', ['x', 'y']), support.item('b', ['z'], 'hover') ], [ support.item('c', []) ]),
+        't2':support.toolbar('Two', [])
+        })
+    data['config']['reactionOpenByCmb'] = 'right'
+    t1 = data['toolbars']['t1']
+    t1['config']['intButtonSize'] = 48
+    t1['config']['toolbarTypeCmb'] = 'float'
+    # what this version doesn't know is kept as it is
+    data['future'] = { 'k':[1, 2] }
+    t1['top']['collapsed'] = True
+    t1['top']['items'][0]['color'] = 'red'
+    t1['top']['items'][0]['reactions'][0]['actions'][0]['extra'] = 1
+    t1['bottom']['items'][0]['reactions'][0]['dockers'] = [ { 'name':'LayerBox' } ]
+    return data
+
+
+class LayoutTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = sample()
+        layout = Layout.compile(data)
+        # same content and the same key order
+        self.assertEqual(json.dumps(layout.toJson()), json.dumps(data))
+        self.assertEqual(Layout.compile(layout.toJson()), layout)
+
+    def test_round_trip_of_the_fixture(self):
+        self.assertEqual(Layout.compile(support.SETTINGS).toJson(), support.SETTINGS)
+
+    def test_compiled_values(self):
+        layout = Layout.compile(sample())
+        t1 = layout.toolbars['t1']
+        self.assertEqual( (t1.name, t1.type, t1.buttonSize, t1.position), ('One', 'float', 48, 'Bottom') )
+        self.assertEqual(layout.openBy, 'right')
+        self.assertEqual( [ (panel, item.uuid) for panel, item in t1.items() ], [ ('top', 'a'), ('top', 'b'), ('bottom', 'c') ] )
+        self.assertEqual(t1.top[1].reactions[0].openBy, 'hover')
+        self.assertEqual(layout.toolbars['t2'].top, ())
+
+    def test_nodes_are_immutable(self):
+        t1 = Layout.compile(sample()).toolbars['t1']
+        with self.assertRaises(AttributeError):
+            t1.name = 'x'
+        with self.assertRaises(AttributeError):
+            del t1.top[0].alias
+
+    def test_errors_name_the_path(self):
+        data = sample()
+        data['toolbars']['t1']['top']['items'][1]['uuid'] = 3
+        with self.assertRaises(LayoutError) as e:
+            Layout.compile(data)
+        self.assertEqual(e.exception.path, 'settings.toolbars[t1].top.items[1].uuid')
+        data['config'] = []
+        self.assertRaises(LayoutError, Layout.compile, data)
+
+    def test_unchanged_toolbars_are_reused(self):
+        data = sample()
+        layout = Layout.compile(data)
+        t1, t2 = layout.toolbars['t1'], layout.toolbars['t2']
+        edited = copy.deepcopy(data)
+        edited['toolbars']['t2']['config']['toolbarName'] = 'Renamed'
+        again = Layout.compile(edited, layout, { 't2' })
+        self.assertIs(again.toolbars['t1'], t1)
+        self.assertIsNot(again.toolbars['t2'], t2)
+        self.assertEqual(again.toolbars['t2'].name, 'Renamed')
+        self.assertEqual(again.toJson(), edited)
+
+    def test_lazy_toolbars_compile_on_lookup(self):
+        from ToolBarUI.ToolBarUISettings import SettingsStore, MemorySettingsBackend
+        store = SettingsStore(MemorySettingsBackend({ None:json.dumps(sample()) }))
+        settings = store.load()
+        layout = Layout.compile(settings)
+        self.assertFalse(layout.toolbars.isCompiled('t1'))
+        self.assertIsInstance(layout.toolbars['t1'], Toolbar)
+        self.assertTrue(layout.toolbars.isCompiled('t1'))
+        self.assertEqual(layout.toolbars['t1'], Layout.compile(sample()).toolbars['t1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
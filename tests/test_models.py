@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import support
+from PyQt5.QtCore import Qt, QItemSelectionModel, QPersistentModelIndex
+from PyQt5.QtWidgets import QListView
+from PyQt5.QtTest import QAbstractItemModelTester, QSignalSpy
+from ToolBarUI.ToolBarUIModels import SettingsListModel
+
+
+class SettingsListModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [ { 'uuid':str(i), 'alias':'a%d' % i } for i in range(5) ]
+        self.model = SettingsListModel(lambda: self.rows, lambda v: v['alias'], key=lambda v: v['uuid'], userData=lambda v: v['uuid'])
+        self.tester = QAbstractItemModelTester(self.model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+    def labels(self):
+        return [ self.model.data(self.model.index(i)) for i in range(self.model.rowCount()) ]
+
+    def test_reads_the_source(self):
+        self.assertEqual(self.labels(), [ 'a0', 'a1', 'a2', 'a3', 'a4' ])
+        self.assertEqual(self.model.index(2).data(Qt.UserRole+1), '2')
+
+    def test_edits_are_emitted_as_row_changes(self):
+        reset = QSignalSpy(self.model.modelReset)
+        inserted = QSignalSpy(self.model.rowsInserted)
+        removed = QSignalSpy(self.model.rowsRemoved)
+        moved = QSignalSpy(self.model.rowsMoved)
+        changed = QSignalSpy(self.model.dataChanged)
+        before = dict(self.model.stats)
+
+        self.rows.insert(1, { 'uuid':'new', 'alias':'new' })
+        del self.rows[4]
+        self.rows.insert(0, self.rows.pop())
+        self.rows[1]['alias'] = 'renamed'
+        self.model.sync()
+
+        self.assertEqual(self.labels(), [ v['alias'] for v in self.rows ])
+        self.assertEqual( (len(reset), len(inserted), len(removed), len(moved), len(changed)), (0, 1, 1, 1, 1) )
+        self.assertEqual( [ self.model.stats[k] - before[k] for k in ('inserted', 'removed', 'moved', 'changed') ], [1, 1, 1, 1] )
+
+    def test_an_unchanged_source_emits_nothing(self):
+        changed = QSignalSpy(self.model.dataChanged)
+        self.model.sync()
+        self.assertEqual(len(changed), 0)
+
+    def test_persistent_indexes_follow_their_row(self):
+        index = QPersistentModelIndex(self.model.index(3))
+        self.rows.insert(0, { 'uuid':'new', 'alias':'new' })
+        self.rows.reverse()
+        self.model.sync()
+        self.assertEqual(index.data(), 'a3')
+        self.assertEqual(self.rows[index.row()]['uuid'], '3')
+
+    def test_random_edits_keep_the_selection(self):
+        rng = random.Random(3)
+        view = QListView()
+        view.setModel(self.model)
+        n = 100
+        for step in range(500):
+            op = rng.random()
+            if op < .3 and self.rows:
+                self.rows.pop(rng.randrange(len(self.rows)))
+            elif op < .6:
+                self.rows.insert(rng.randrange(len(self.rows) + 1), { 'uuid':str(n), 'alias':'a%d' % n })
+                n += 1
+            elif op < .8 and len(self.rows) > 1:
+                i, j = rng.randrange(len(self.rows)), rng.randrange(len(self.rows))
+                self.rows[i], self.rows[j] = self.rows[j], self.rows[i]
+            elif self.rows:
+                rng.choice(self.rows)['alias'] += 'x'
+            if rng.random() < .1:
+                rng.shuffle(self.rows)
+
+            selected = None
+            if self.model.rowCount():
+                row = rng.randrange(self.model.rowCount())
+                selected = self.model.keys[row]
+                view.selectionModel().select(self.model.index(row), QItemSelectionModel.ClearAndSelect)
+            self.model.sync()
+
+            self.assertEqual(self.labels(), [ v['alias'] for v in self.rows ])
+            if selected in self.model.keys:
+                self.assertEqual(view.selectionModel().selectedIndexes()[0].row(), self.model.keys.index(selected))
+
+
+class SettingsListModelBenchmark(unittest.TestCase):
+    """The refresh after an edit, over growing lists. A sync is linear in
+    the rows, about a microsecond each; the limit leaves room for slow
+    machines."""
+    SIZES = (100, 1000, 10000)
+    ROW = 10e-6
+    EDITS = 20
+
+    def test_sync_cost_grows_with_the_rows(self):
+        for n in self.SIZES:
+            rows = [ { 'uuid':str(i), 'alias':'a%d' % i } for i in range(n) ]
+            model = SettingsListModel(lambda: rows, lambda v: v['alias'], key=lambda v: v['uuid'])
+            view = QListView()
+            view.setModel(model)
+            before = dict(model.stats)
+            for k in range(self.EDITS):
+                rows[k * 7 % n]['alias'] += 'x'
+                rows.insert(0, rows.pop())
+                model.sync()
+            mean = (model.stats['time'] - before['time']) / (model.stats['syncs'] - before['syncs'])
+            self.assertLess(mean, 0.001 + n * self.ROW, n)
+
+
+if __name__ == '__main__':
+    unittest.main()
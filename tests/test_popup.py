@@ -0,0 +1,53 @@
+"""Open to paint latency of prebuilt Action Collection popups. Runs
+offscreen, also on its own: python tests/test_popup.py"""
+import time
+import unittest
+
+import support
+from support import extension
+from PyQt5.QtCore import Qt, QCoreApplication, QEvent
+from PyQt5.QtTest import QTest
+
+
+class PopupLatencyBenchmark(unittest.TestCase):
+    """A grid popup and a list one, built at idle time and then opened
+    from their buttons. Each opening has to paint within a frame."""
+    FRAME = 1 / 60
+    OPENS = 20
+    LIST = 100
+
+    def setUp(self):
+        big = support.item('big', [ 'abcde'[i % 5] for i in range(self.LIST) ])
+        support.edit(lambda s, j: j.append(s['toolbars']['t1']['bottom']['items'], big, 't1'))
+        self.qwin = support.openWindow()
+        self.toolbar = extension.windows[self.qwin]['t1']
+
+    def tearDown(self):
+        self.qwin.deleteLater()
+        support.idle()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        support.edit(lambda s, j: j.pop(s['toolbars']['t1']['bottom']['items'], -1, 't1'))
+
+    def open(self, button):
+        QTest.mouseClick(button, Qt.LeftButton)
+        popup = extension.popups.popups[button.popup]
+        start = time.perf_counter()
+        while popup.opened is not None and time.perf_counter() - start < 1:
+            support.app.processEvents()
+        extension.popups.close(button.popup)
+        return popup
+
+    def test_prebuilt_popups_paint_within_a_frame(self):
+        built = extension.popups.stats['built']
+        for (button, virtualized) in zip(self.toolbar.items['bottom'], (False, True)):
+            for i in range(self.OPENS):
+                popup = self.open(button)
+            self.assertEqual(popup.view is not None, virtualized)
+            self.assertEqual(popup.stats['opens'], self.OPENS)
+            self.assertLess(popup.stats['maxLatency'], self.FRAME)
+        # nothing was built on the way to the screen
+        self.assertEqual(extension.popups.stats['built'], built)
+
+
+if __name__ == '__main__':
+    unittest.main()
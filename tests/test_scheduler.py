@@ -0,0 +1,141 @@
+import time
+import unittest
+
+import support
+from PyQt5.QtTest import QSignalSpy
+from ToolBarUI.ToolBarUIScheduler import TimerWheel, WheelTimer
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = TimerWheel(tick=0.01, slots=16, clock=self.clock)
+        self.fired = []
+
+    def later(self, seconds):
+        self.clock.now += seconds
+        self.wheel.advance()
+
+    def schedule(self, key, delay):
+        self.wheel.schedule(key, delay, lambda: self.fired.append(key))
+
+    def test_fires_once_after_its_delay(self):
+        self.schedule('a', 0.05)
+        self.later(0.04)
+        self.assertEqual(self.fired, [])
+        self.later(0.02)
+        self.assertEqual(self.fired, ['a'])
+        self.later(1.0)
+        self.assertEqual(self.fired, ['a'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_zero_delay_waits_for_the_next_tick(self):
+        self.schedule('a', 0)
+        self.wheel.advance()
+        self.assertEqual(self.fired, [])
+        self.later(0.01)
+        self.assertEqual(self.fired, ['a'])
+
+    def test_rescheduling_a_key_replaces_it(self):
+        self.schedule('a', 0.05)
+        self.later(0.03)
+        self.schedule('a', 0.05)
+        self.later(0.03)
+        self.assertEqual(self.fired, [])
+        self.later(0.03)
+        self.assertEqual(self.fired, ['a'])
+        self.assertEqual(self.wheel.stats['scheduled'], 2)
+        self.assertEqual(self.wheel.stats['fired'], 1)
+
+    def test_cancel(self):
+        self.schedule('a', 0.05)
+        self.schedule('b', 0.05)
+        self.wheel.cancel('a')
+        self.wheel.cancel('missing')
+        self.assertNotIn('a', self.wheel)
+        self.later(0.1)
+        self.assertEqual(self.fired, ['b'])
+        self.assertEqual(self.wheel.stats['cancelled'], 1)
+
+    def test_delays_longer_than_a_round(self):
+        # 16 slots of 10 ms: 0.35 s goes round the wheel twice
+        self.schedule('long', 0.35)
+        self.schedule('short', 0.02)
+        for i in range(34):
+            self.later(0.01)
+        self.assertEqual(self.fired, ['short'])
+        self.later(0.02)
+        self.assertEqual(self.fired, ['short', 'long'])
+
+    def test_a_stall_runs_everything_due(self):
+        for i in range(40):
+            self.schedule(i, 0.01 * (i + 1))
+        self.later(10.0)
+        self.assertEqual(sorted(self.fired), list(range(40)))
+        self.assertLessEqual(self.wheel.stats['ticks'], 16)
+
+    def test_callbacks_may_reschedule_and_cancel(self):
+        def first():
+            self.fired.append('first')
+            self.wheel.cancel('second')
+            self.schedule('first', 0.01)
+        self.wheel.schedule('first', 0.01, first)
+        self.schedule('second', 0.01)
+        self.later(0.01)
+        self.assertEqual(self.fired, ['first'])
+        self.assertIn('first', self.wheel)
+        self.later(0.01)
+        self.assertEqual(self.fired, ['first', 'first'])
+
+    def test_next_deadline(self):
+        self.assertIsNone(self.wheel.nextDeadline())
+        self.schedule('a', 0.05)
+        self.schedule('b', 0.02)
+        self.assertAlmostEqual(self.wheel.nextDeadline(), 0.02, delta=0.011)
+        self.clock.now += 0.5
+        self.assertEqual(self.wheel.nextDeadline(), 0.0)
+        self.wheel.advance()
+        self.assertIsNone(self.wheel.nextDeadline())
+
+
+class WheelTimerTest(unittest.TestCase):
+
+    def test_waits_for_the_earliest_deadline(self):
+        timer = WheelTimer(TimerWheel())
+        fired = []
+        timer.schedule('late', 0.2, lambda: fired.append('late'))
+        timer.schedule('early', 0.05, lambda: fired.append('early'))
+        self.assertGreater(timer.timer.remainingTime(), 30)
+        timeouts = QSignalSpy(timer.timer.timeout)
+
+        start = time.monotonic()
+        while len(fired) < 2 and time.monotonic() - start < 2:
+            support.app.processEvents()
+            time.sleep(0.001)
+        self.assertEqual(fired, ['early', 'late'])
+        self.assertFalse(timer.timer.isActive())
+        # a timeout per deadline, not one every 10 ms
+        self.assertLessEqual(len(timeouts), 4)
+
+    def test_stops_after_the_last_timer_is_cancelled(self):
+        timer = WheelTimer(TimerWheel())
+        timer.schedule('a', 0.02, lambda: None)
+        timer.cancel('a')
+        start = time.monotonic()
+        while timer.timer.isActive() and time.monotonic() - start < 1:
+            support.app.processEvents()
+            time.sleep(0.001)
+        self.assertFalse(timer.timer.isActive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import time
+import random
+import unittest
+
+import support
+from ToolBarUI.ToolBarUISearch import SearchIndex, words
+
+
+def document(name, toolTip='', shortcut=''):
+    return (name, [ (name, 1.0), (toolTip, 0.9), (shortcut, 0.7) ])
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex([
+            document('select_all', 'Select All', 'Ctrl+A'),
+            document('selection_tool', 'Rectangular Selection Tool', 'Ctrl+R'),
+            document('KisToolSelectContiguous', 'Contiguous Selection Tool'),
+            document('brush_size_up', 'Increase Brush Size', ']'),
+            document('reselect', 'Reselect', 'Ctrl+Shift+D'),
+            document('mirror_canvas', 'Mirror View', 'M'),
+            ])
+
+    def test_words(self):
+        self.assertEqual(words('KisToolSelectRGB2'), [ 'kis', 'tool', 'select', 'rgb', '2' ])
+        self.assertEqual(words('brush_size-up'), [ 'brush', 'size', 'up' ])
+
+    def test_empty_query_gives_everything(self):
+        self.assertEqual(self.index.search('  '), list(self.index.keys))
+
+    def test_ranking(self):
+        # prefix before word boundary before substring
+        self.assertEqual(self.index.search('select')[:2], [ 'select_all', 'selection_tool' ])
+        self.assertEqual(self.index.search('select')[-1], 'reselect')
+        self.assertEqual(self.index.search('contig'), [ 'KisToolSelectContiguous' ])
+
+    def test_initials_words_and_shortcuts(self):
+        self.assertEqual(self.index.search('bsu')[0], 'brush_size_up')
+        self.assertEqual(self.index.search('size brush'), [ 'brush_size_up' ])
+        self.assertEqual(self.index.search('ctrl+a')[0], 'select_all')
+
+    def test_fuzzy(self):
+        self.assertEqual(self.index.search('mrrcnv'), [ 'mirror_canvas' ])
+        self.assertEqual(self.index.search('qqq'), [])
+
+    def test_narrowing_matches_a_fresh_search(self):
+        for query in ('selection t', 'brsz', 'mirror v'):
+            for k in range(1, len(query) + 1):
+                typed = self.index.search(query[:k])
+            fresh = SearchIndex( document(k, *[ f.text for f in fields[1:] ]) for k, fields in zip(self.index.keys, self.index.fields) )
+            self.assertEqual(typed, fresh.search(query))
+
+
+class SearchIndexBenchmark(unittest.TestCase):
+    """Typing into the action picker of a full Krita, about 1600 actions.
+    The limits leave room for slow machines, a keystroke typically takes
+    a few ms."""
+    DOCUMENTS = 1600
+    KEYSTROKE = 0.05
+    BUILD = 0.5
+
+    def test_keystrokes(self):
+        rng = random.Random(1)
+        vocabulary = ( 'brush size opacity layer select rectangular tool paint flip mirror canvas zoom rotate color pick fill '
+                       'gradient transform move erase blend mode view show hide dock reset save export import filter adjust' ).split()
+        docs = []
+        for i in range(self.DOCUMENTS):
+            ws = rng.sample(vocabulary, 3)
+            name = rng.choice([ '_'.join(ws), 'Kis' + ''.join( w.title() for w in ws ), ws[0] + ws[1].title() ]) + str(i % 7)
+            docs.append( document(name, ' '.join(ws).capitalize() + ' action', 'Ctrl+' + rng.choice('ABCDEFG')) )
+
+        start = time.perf_counter()
+        index = SearchIndex(docs)
+        build = time.perf_counter() - start
+
+        worst = 0.0
+        for query in ('sel', 'select a', 'sa', 'KisSel', 'brsz', 'brush size', 'ctrl+a', 'x', 'opac layer'):
+            for k in range(1, len(query) + 1):
+                index.search(query[:k])
+                worst = max(worst, index.stats['lastTime'])
+
+        self.assertLess(build, self.BUILD)
+        self.assertLess(worst, self.KEYSTROKE)
+        self.assertLess(index.stats['time'] / index.stats['queries'], self.KEYSTROKE / 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Repeated edits and popups must not leave widgets, action connections or
+memory behind. Runs offscreen, also on its own: python tests/test_soak.py"""
+import gc
+import unittest
+import tracemalloc
+
+import support
+from support import extension
+from PyQt5.QtCore import Qt, QCoreApplication, QEvent
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtTest import QTest
+
+
+class SoakTest(unittest.TestCase):
+    ROUNDS = 200
+    # allowed growth of the traced python memory over the measured rounds
+    MEMORY = 256 * 1024
+
+    def setUp(self):
+        self.qwin = support.openWindow()
+        self.toolbar = extension.windows[self.qwin]['t1']
+
+    def tearDown(self):
+        self.qwin.deleteLater()
+        support.idle()
+
+    def counts(self):
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        gc.collect()
+        return (len(QApplication.allWidgets()), self.toolbar.accounting(), extension.accounting()['actionConnections'])
+
+    def round(self, n):
+        if n % 2 == 0:
+            support.edit(lambda s, j: [ j.pop(s['toolbars']['t1']['top']['items'], 0, 't1') for k in range(5) ])
+        else:
+            support.edit(lambda s, j: [ j.append(s['toolbars']['t1']['top']['items'], support.item('n%d_%d' % (n, k), ['c']), 't1') for k in range(5) ])
+        button = self.toolbar.items['bottom'][0]
+        QTest.mouseClick(button, Qt.LeftButton)
+        self.assertEqual(self.toolbar.accounting()['popups'], 1)
+        extension.popups.close(button.popup)
+        support.idle()
+
+    def test_counts_stay_flat(self):
+        tracemalloc.start()
+        try:
+            for n in range(10):
+                self.round(n)
+            base = self.counts()
+            memory = tracemalloc.get_traced_memory()[0]
+            for n in range(10, self.ROUNDS):
+                self.round(n)
+            self.assertEqual(self.counts(), base)
+            self.assertLess(tracemalloc.get_traced_memory()[0] - memory, self.MEMORY)
+        finally:
+            tracemalloc.stop()
+
+        order = [ self.toolbar.widgetForAction(a).s.uuid for a in self.toolbar.actions() ]
+        t1 = extension.settings['toolbars']['t1']
+        self.assertEqual(order, [ i['uuid'] for i in t1['top']['items'] + t1['bottom']['items'] ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,29 @@
 from krita import *
 import xml.etree.ElementTree as ET
 import re
-from PyQt5 import uic
 import functools
-import copy
-import json
+import time
+from .ToolBarUILayout import Layout, Reaction, LayoutError
+from .ToolBarUIJournal import Journal
+from .ToolBarUICatalog import IconCatalog, ActionCatalog, ActionEntry, WindowActions, IconCache, DockerIndex, PixmapCache, ICONS_KRITA, ICONS_KRITA_EXTRA, ICONS_THEME
+from .ToolBarUIModels import IconListModel, ActionTableModel, SettingsListModel
+from .ToolBarUIRender import IconRenderer
+from .ToolBarUIDialogs import DialogPool
+from .ToolBarUIState import ActionStateHub
+from .ToolBarUIScheduler import IdleQueue, TimerWheel, WheelTimer
+from .ToolBarUIPopup import PopupCache
+from .ToolBarUIProximity import ProximityTracker
+from .ToolBarUIDrawer import DrawerSlide
+from .ToolBarUISettings import SettingsStore, SettingsWriter, SettingsError, RecoveryFile, KritaSettingsBackend, MemorySettingsBackend, GROUP, emptyToolbar
 
 
 class ToolBarUI(Extension):
+    VERSION = '0.1'
+    ICON_PREVIEW_CACHE = 16*1024*1024
+    # build toolbars at idle time after the window is created, hidden ones
+    # when they are first shown
+    STAGED_STARTUP = True
+    
     REACTION_BY = {
         'Default':'default',
         'Left Click':'left',
@@ -24,36 +40,75 @@ class ToolBarUI(Extension):
         'Floating Drawer':'float_drawer',
         'Docked':'docked'
         }
+    # toolbar types shown over the window when the pointer comes near
+    REACTIVE_TYPES = ('float_react', 'float_react_drawer')
+    REACTIVE_MARGIN = 16
+    # toolbar types sliding out of the window edge
+    DRAWER_TYPES = ('float_drawer', 'float_react_drawer')
     
     
     def __init__(self, parent):
         super().__init__(parent)
         self.active = False
         
-        settingsData = Krita.instance().readSetting("", "pluginToolBarUI","")
-        
-        self.settings = {}
-        if settingsData.startswith('{'):
-            self.settings = json.loads(settingsData)
-        else:
-        
-            self.settings = {
-                    'version':0,
-                    'count': 0,
-                    'config':{},
-                    'toolbars':{}
-            }
-        
-        self.toolBars = {}
+        # only the index record is parsed here, toolbar records are parsed
+        # when the toolbar is first built
+        self.recovery = RecoveryFile(os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericConfigLocation), GROUP))
+        self.store = SettingsStore(KritaSettingsBackend(), self.recovery)
+        try:
+            self.settings = self.store.load()
+            self.layout = Layout.compile(self.settings)
+            self.settingsError = None
+        except (SettingsError, LayoutError, ValueError) as e:
+            # the session runs without toolbars, and nothing is saved over
+            # settings that could not be read
+            print ("ToolBarUI: ignoring invalid settings,", e)
+            self.settingsError = e
+            self.settings = SettingsStore(MemorySettingsBackend()).load()
+            self.layout = Layout.compile(self.settings)
+        
+        self.writer = SettingsWriter(self.store, self.store.recovery, parent=self)
+        QCoreApplication.instance().aboutToQuit.connect( functools.partial(self.writer.flush, True) )
+        
+        self.iconCatalog = None
+        self.iconPreviewCache = PixmapCache(self.ICON_PREVIEW_CACHE)
+        self.iconRenderer = None
+        self.actionCatalog = ActionCatalog.instance(Krita.instance())
+        self.windowActions = WindowActions(self.actionCatalog)
+        self.actionModel = None
+        self.iconCache = IconCache.instance(Krita.instance().icon)
+        self.iconCache.invalidated.connect(self.iconsInvalidated)
+        self.dockerIndex = DockerIndex()
+        self.dialogs = DialogPool(self.setupDialog)
+        
+        # main window -> { toolbar uuid: panel }, every window has its own
+        # panels built from the one shared layout
+        self.windows = {}
+        self.qwin = None
         self.subActions = {}
+        self.reconcileStats = {}
         
+        self.journal = None
         self.onConfigReaction = None
-        self.reactionState = None
-        
-        self.itemState = None
-        self.toolbarState = None
-        
-        self.boundActions = []
+        self.reactionScope = False
+        
+        self.stateHub = ActionStateHub(self)
+        
+        self.idle = IdleQueue(parent=self)
+        self.idle.drained.connect(self.startupDone)
+        # open/close delays of every button run on one timer wheel
+        self.timers = WheelTimer(TimerWheel(), self)
+        # Action Collection popups by reaction uuid, prebuilt at idle time
+        self.popups = PopupCache(self.idle, self.iconCache, self.timers)
+        
+        self.proximity = ProximityTracker(self)
+        self.proximity.entered.connect(self.reactiveEntered)
+        self.proximity.left.connect(self.reactiveLeft)
+        self.proximity.windowResized.connect(self.placeOverlays)
+        # time the plugin spends in window creation, and from there until
+        # the deferred toolbars are built
+        self.startupStats = { 'createActions':0.0, 'windowCreated':0.0, 'deferred':None }
+        self.startupBegin = None
         
         self.notifier = Krita.instance().notifier()
         self.notifier.windowCreated.connect(self.windowCreatedSetup)
@@ -61,7 +116,10 @@ class ToolBarUI(Extension):
         
 
     def createActions(self, window):
+        start = time.perf_counter()
         self.qwin = window.qwindow()
+        self.windows[self.qwin] = {}
+        self.qwin.destroyed.connect( functools.partial(self.windowDestroyed, self.qwin) )
         
 
         action = window.createAction("toolbarUI", "ToolBar UI", "tools/scripts")
@@ -77,10 +135,92 @@ class ToolBarUI(Extension):
         #self.subActions['addToolBar'].triggered.connect( functools.partial( self.writeSettings, self.configToolBar ) )
         
         
-        self.registerToolBars()
+        self.registerToolBars(self.qwin)
+        self.startupStats['createActions'] += time.perf_counter() - start
+    
+    def windowDestroyed(self, qwin):
+        # the panels are gone with the window, drop what refers to them
+        self.proximity.removeWindow(qwin)
+        self.dockerIndex.invalidate(qwin)
+        self.windowActions.invalidate(qwin)
+        for t in self.windows.pop(qwin, {}).values():
+            self.idle.cancel(('build', t))
+            self.timers.cancel(('reveal', t))
+            self.timers.cancel(('conceal', t))
+            for button in list(t.itemActions) + list(t.spareActions):
+                button.unbind()
+        self.popups.retain( self.popupKeys() )
+        if self.qwin is qwin:
+            self.qwin = next(iter(self.windows), None)
+        # buttons of the other windows may have fallen back on actions of
+        # this one, they are bound again once its children are gone
+        if self.windows:
+            self.idle.post('rebind', self.rebindButtons)
+    
+    def rebindButtons(self):
+        self.actionCatalog.refresh()
+        for (tuuid, t) in self.panels():
+            for button in t.itemActions:
+                button.bind(button.s)
+    
+    def activeWindow(self):
+        window = Krita.instance().activeWindow()
+        if window is not None and window.qwindow() in self.windows:
+            return window.qwindow()
+        return self.qwin
+    
+    def panels(self):
+        for toolBars in self.windows.values():
+            for (tuuid, t) in toolBars.items():
+                yield (tuuid, t)
         
     def windowCreatedSetup(self):
-        self.buildToolBars()
+        start = time.perf_counter()
+        if self.STAGED_STARTUP:
+            self.scheduleToolBars()
+            # new actions are picked up on lookup meanwhile
+            self.idle.post('actionCatalog', self.actionCatalog.refresh, len(self.settings['toolbars']))
+            self.startupBegin = start
+        else:
+            self.actionCatalog.refresh()
+            self.buildToolBars()
+        self.startupStats['windowCreated'] += time.perf_counter() - start
+    
+    def startupDone(self):
+        if self.startupBegin is not None:
+            self.startupStats['deferred'] = time.perf_counter() - self.startupBegin
+            self.startupBegin = None
+    
+    def scheduleToolBars(self):
+        # visible toolbars get a placeholder of their final size and are
+        # built in order at idle time, hidden ones wait for showEvent
+        order = { tuuid:i for i, tuuid in enumerate(self.settings['toolbars'].keys()) }
+        for (tuuid, t) in self.panels():
+            if t.built or self.isDeferred(tuuid, t):
+                continue
+            try:
+                if not t.isHidden():
+                    t.showSkeleton(self.layout.toolbars.get(tuuid))
+            except (SettingsError, LayoutError, ValueError):
+                pass
+            self.idle.post(('build', t), functools.partial(self.buildDeferred, t), order.get(tuuid, 0))
+    
+    def isDeferred(self, tuuid, t):
+        # toolbars that were never shown are built when they first are,
+        # except overlays: they stay hidden until revealed, which needs
+        # them built and placed
+        if t.built or not t.isHidden():
+            return False
+        try:
+            s = self.layout.toolbars.get(tuuid)
+        except (SettingsError, LayoutError, ValueError):
+            return True
+        return s is None or not (s.type in self.REACTIVE_TYPES or s.type in self.DRAWER_TYPES)
+    
+    def buildDeferred(self, t):
+        stats = { 'created':0, 'reused':0, 'updated':0, 'moved':0, 'removed':0 }
+        self.idle.cancel(('build', t))
+        self.buildItems(t, stats)
 
     
     
@@ -88,60 +228,103 @@ class ToolBarUI(Extension):
         self.configItem()
     
     def writeSettings(self, func):
-
-        
-        self.tempSettings = copy.deepcopy(self.settings)
-        func()
-        self.settings = self.tempSettings
-        self.settings['version']=0.001
-        
-        Krita.instance().writeSetting('', 'pluginToolBarUI', json.dumps(self.settings) )
+        if self.settingsError is not None:
+            QMessageBox.warning(self.activeWindow(), "ToolBar UI", "The saved settings could not be read, so they can't be changed:\n" + str(self.settingsError))
+            return
+
+        # The dialogs edit the settings in place through the journal, a
+        # cancelled or invalid session is rolled back instead of copied.
+        self.tempSettings = self.settings
+        self.journal = Journal()
+        self.journal.begin()
+        
+        if not func():
+            self.journal.rollback()
+            return
+        
+        tags = self.journal.tags()
+        try:
+            layout = Layout.compile(self.tempSettings, self.layout, tags)
+        except LayoutError as e:
+            self.journal.rollback()
+            QMessageBox.warning(self.activeWindow(), "ToolBar UI", "The new settings are invalid and were not applied:\n" + str(e))
+            return
+        
+        self.journal.commit()
+        self.layout = layout
+        self.checkActions(layout, tags)
+        
+        self.writer.schedule(self.settings, layout, tags)
         
         self.registerToolBars()
         self.buildToolBars()
 
+    def checkActions(self, layout, tags):
+        # actions of other plugins may only be registered later, so unknown
+        # names are reported but kept
+        names = set()
+        for tuuid in tags:
+            if tuuid in layout.toolbars:
+                for panel, item in layout.toolbars[tuuid].items():
+                    for r in item.reactions:
+                        names.update( ra.name for ra in r.actions )
+        missing = self.actionCatalog.missing(sorted(names))
+        if missing:
+            print ("ToolBarUI: unknown actions", ', '.join(missing))
+        return missing
+    
+    def dialog(self, name):
+        # dialogs are pooled, the form is built once and reset when the
+        # dialog is handed back with releaseDialog(); a picker opens over
+        # the dialog it was called from
+        return self.dialogs.acquire(name, QApplication.activeModalWidget() or self.activeWindow())
+    
+    def releaseDialog(self, dlg):
+        self.dialogs.release(dlg)
     
-    def dialog(self,name, standard = True):
-        dlg = QDialog(self.qwin)
-        dlg.centralWidget = uic.loadUi(os.path.dirname(os.path.realpath(__file__)) + '/'+name+'.ui')
-        layout = QVBoxLayout()
+    def setupDialog(self, dlg):
+        # everything that does not depend on the settings being edited
+        form = dlg.centralWidget
         
-        dlg.btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        if hasattr(form, 'reactionOpenByCmb'):
+            for (k, v) in self.REACTION_BY.items():
+                form.reactionOpenByCmb.addItem(k, v)
+                form.reactionCloseByCmb.addItem(k, v)
         
-        dlg.btns.rejected.connect(dlg.reject)
+        if hasattr(form, 'toolbarTypeCmb'):
+            for (k, v) in self.TOOLBAR_TYPE.items():
+                form.toolbarTypeCmb.addItem(k, v)
         
-        layout.addWidget(dlg.centralWidget)
-        layout.addWidget(dlg.btns)
-        dlg.setLayout(layout)
+        if hasattr(form, 'reactionTypeCmb'):
+            form.reactionTypeCmb.currentIndexChanged.connect(form.stackedWidget.setCurrentIndex)
         
-        if standard:
-            for (k, v) in self.REACTION_BY.items():
-                dlg.centralWidget.reactionOpenByCmb.addItem(k, v)
-                dlg.centralWidget.reactionCloseByCmb.addItem(k, v)
-
+        if dlg.name == 'ConfigOptions':
+            dlg.undoShortcut = QShortcut(QKeySequence.Undo, dlg)
+            dlg.redoShortcut = QShortcut(QKeySequence.Redo, dlg)
         
-        return dlg
+        if dlg.name == 'IconPicker':
+            dlg.iconsGroup = QButtonGroup(form)
+            dlg.iconsGroup.setExclusive(False)
+            
+            dlg.iconsGroup.addButton( form.boolIconsKrita )
+            dlg.iconsGroup.addButton( form.boolIconsKritaExtra )
+            dlg.iconsGroup.addButton( form.boolIconsTheme )
+            
+            form.iconsListView.setGridSize( QSize(128,128) )
+            form.iconsListView.setIconSize( QSize(64,64) )
+            form.iconsListView.setUniformItemSizes(True)
     
     def config(self):
         dlg = self.dialog('ConfigOptions')
         
-        
-
-        for (k, v) in self.TOOLBAR_TYPE.items():
-            dlg.centralWidget.toolbarTypeCmb.addItem(k, v)
-
-        
-        model = QStandardItemModel()
+        model = SettingsListModel(
+            lambda: self.tempSettings['toolbars'].keys(),
+            lambda tuuid: self.tempSettings['toolbars'].name(tuuid),
+            key=str, userData=str, parent=dlg )
         dlg.centralWidget.toolbarListView.setModel(model)
         
         def fillToolbars():
-            model.clear()
-            for tuuid in self.tempSettings['toolbars'].keys():
-                item = QStandardItem(self.tempSettings['toolbars'][tuuid]['config']['toolbarName'])
-                item.setData(tuuid, Qt.UserRole+1)
-                model.appendRow(item)
-                
-        fillToolbars()
+            model.sync()
 
 
         def editToolBar():
@@ -150,7 +333,7 @@ class ToolBarUI(Extension):
                 self.configToolBar(idx[0].data(Qt.UserRole+1))
                 fillToolbars()
 
-        dlg.centralWidget.toolbarEditBtn.clicked.connect(editToolBar)
+        dlg.connect(dlg.centralWidget.toolbarEditBtn.clicked, editToolBar)
 
         
         def addToolBar():
@@ -158,87 +341,69 @@ class ToolBarUI(Extension):
             fillToolbars()
 
 
-        dlg.centralWidget.toolbarAddBtn.clicked.connect(addToolBar)
+        dlg.connect(dlg.centralWidget.toolbarAddBtn.clicked, addToolBar)
 
         def removeToolbar():
             idx = dlg.centralWidget.toolbarListView.selectedIndexes()
             if idx and idx[0]:
-                del self.tempSettings['toolbars'][idx[0].data(Qt.UserRole+1)]
+                tuuid = idx[0].data(Qt.UserRole+1)
+                self.journal.delete(self.tempSettings['toolbars'], tuuid, tuuid)
                 fillToolbars()
         
-        dlg.centralWidget.toolbarRemoveBtn.clicked.connect(removeToolbar)
+        dlg.connect(dlg.centralWidget.toolbarRemoveBtn.clicked, removeToolbar)
 
+        def undo():
+            if self.journal.undo(): fillToolbars()
+        
+        def redo():
+            if self.journal.redo(): fillToolbars()
+        
+        dlg.connect(dlg.undoShortcut.activated, undo)
+        dlg.connect(dlg.redoShortcut.activated, redo)
         
         def updateChanges():
 
-            self.saveForm(dlg.centralWidget, self.tempSettings['config'])
-            self.settings = self.tempSettings
+            self.saveForm(dlg, self.tempSettings['config'], 'config')
 
 
             dlg.accept()
-            
-        def cancelChanges():
-            
-            dlg.reject()
         
-        dlg.btns.accepted.connect(updateChanges)
-        dlg.btns.rejected.connect(cancelChanges)
-        dlg.exec()
-        
-        #return settings
+        dlg.connect(dlg.btns.accepted, updateChanges)
+        accepted = dlg.exec() == QDialog.Accepted
+        self.releaseDialog(dlg)
+        return accepted
 
     def configToolBar(self, tuuid=None):
         dlg = self.dialog('ToolBarOptions')
         
         #settings = self.settings
 
-        
-        for (k, v) in self.TOOLBAR_TYPE.items():
-            dlg.centralWidget.toolbarTypeCmb.addItem(k, v)
+        self.journal.begin()
         
         if tuuid is not None: 
 
             #dlg.centralWidget.toolbarName.setText( self.tempSettings['toolbars'][tuuid]['toolbarName'] )
-            self.loadForm(dlg.centralWidget,self.tempSettings['toolbars'][tuuid]['config'])
-            self.toolbarState = copy.deepcopy(self.tempSettings['toolbars'][tuuid])
+            self.loadForm(dlg,self.tempSettings['toolbars'][tuuid]['config'])
         else:
             tuuid = QUuid.createUuid().toString()
-            self.tempSettings['toolbars'][tuuid]={
-                'config':{
-                    'toolbarName': "ToolBar "+tuuid
-                    },
-                'top':{
-                    'items':[]
-                    },
-                'bottom':{
-                    'items':[]
-                    }
-                }
+            self.journal.set(self.tempSettings['toolbars'], tuuid, emptyToolbar(tuuid), tuuid)
             dlg.centralWidget.toolbarName.setText( "ToolBar "+tuuid )
-            self.toolbarState = None
 
             
             #toolbar = ToolBarUIPanel(self.qwin)
         
-        topModel = QStandardItemModel()
-        dlg.centralWidget.topbarListView.setModel(topModel)
-        bottomModel = QStandardItemModel()
-        dlg.centralWidget.bottombarListView.setModel(bottomModel)
+        itemModels = []
+        for subpanel in ('top', 'bottom'):
+            itemModel = SettingsListModel(
+                functools.partial(lambda subpanel: self.tempSettings['toolbars'][tuuid][subpanel]['items'], subpanel),
+                lambda v: v['alias'],
+                key=lambda v: v['uuid'], userData=lambda v: v['uuid'], parent=dlg )
+            getattr( dlg.centralWidget, subpanel+'barListView' ).setModel(itemModel)
+            itemModels.append(itemModel)
 
         def fillItems():
-            topModel.clear()
-            for (i, v) in enumerate(self.tempSettings['toolbars'][tuuid]['top']['items']):
-                item = QStandardItem(v['alias'])
-                item.setData(v['uuid'], Qt.UserRole+1)
-                topModel.appendRow(item)
-
-            bottomModel.clear()
-            for (i, v) in enumerate(self.tempSettings['toolbars'][tuuid]['bottom']['items']):
-                item = QStandardItem(v['alias'])
-                item.setData(v['uuid'], Qt.UserRole+1)
-                bottomModel.appendRow(item)
-                
-        fillItems()
+            for itemModel in itemModels:
+                itemModel.sync()
 
 
         def editItem(subpanel):
@@ -257,33 +422,29 @@ class ToolBarUI(Extension):
             currentPanel = getattr( dlg.centralWidget, subpanel+'barListView' )
             idx = currentPanel.selectedIndexes()
             if idx and idx[0]:
-                self.tempSettings['toolbars'][tuuid]['top']['items'].pop( idx[0].row() )
+                self.journal.pop(self.tempSettings['toolbars'][tuuid][subpanel]['items'], idx[0].row(), tuuid)
                 fillItems()
             
-        dlg.centralWidget.topbarAddBtn.clicked.connect( functools.partial(addItem,'top') )
-        dlg.centralWidget.bottombarAddBtn.clicked.connect( functools.partial(addItem,'bottom') )
+        dlg.connect(dlg.centralWidget.topbarAddBtn.clicked, functools.partial(addItem,'top'))
+        dlg.connect(dlg.centralWidget.bottombarAddBtn.clicked, functools.partial(addItem,'bottom'))
         
-        dlg.centralWidget.topbarRemoveBtn.clicked.connect( functools.partial(removeItem,'top') )
-        dlg.centralWidget.bottombarRemoveBtn.clicked.connect( functools.partial(removeItem,'bottom') )
+        dlg.connect(dlg.centralWidget.topbarRemoveBtn.clicked, functools.partial(removeItem,'top'))
+        dlg.connect(dlg.centralWidget.bottombarRemoveBtn.clicked, functools.partial(removeItem,'bottom'))
         
-        dlg.centralWidget.topbarEditBtn.clicked.connect( functools.partial(editItem,'top') )
-        dlg.centralWidget.bottombarEditBtn.clicked.connect( functools.partial(editItem,'bottom') )
+        dlg.connect(dlg.centralWidget.topbarEditBtn.clicked, functools.partial(editItem,'top'))
+        dlg.connect(dlg.centralWidget.bottombarEditBtn.clicked, functools.partial(editItem,'bottom'))
         
         def updateChanges():
             #self.tempSettings['toolbars'][tuuid]['config']['toolbarName']=dlg.centralWidget.toolbarName.text()
-            self.saveForm(dlg.centralWidget, self.tempSettings['toolbars'][tuuid]['config'])
+            self.saveForm(dlg, self.tempSettings['toolbars'][tuuid]['config'], tuuid)
             dlg.accept()
         
-        def cancelChanges():
-            if self.toolbarState is None:
-                del self.tempSettings['toolbars'][tuuid]
-            else:
-                self.tempSettings['toolbars'][tuuid]=self.toolbarState
-            dlg.reject()
-        
-        dlg.btns.accepted.connect(updateChanges)
-        dlg.btns.rejected.connect(cancelChanges)
-        dlg.exec()
+        dlg.connect(dlg.btns.accepted, updateChanges)
+        if dlg.exec() == QDialog.Accepted:
+            self.journal.commit()
+        else:
+            self.journal.rollback()
+        self.releaseDialog(dlg)
 
         #if 'toolbarName' not in self.tempSettings['toolbars'][tuuid]['config']: 
         #    del self.tempSettings['toolbars'][tuuid]
@@ -293,14 +454,16 @@ class ToolBarUI(Extension):
         dlg = self.dialog('ItemOptions')
         
         self.onConfigReaction = 0
+        self.journal.begin()
         
-        for (k, v) in self.tempSettings['toolbars'].items():
-            dlg.centralWidget.toolbarCmb.addItem(v['config']['toolbarName'], v)
+        dlg.centralWidget.toolbarCmb.clear()
+        for k in self.tempSettings['toolbars'].keys():
+            dlg.centralWidget.toolbarCmb.addItem(self.tempSettings['toolbars'].name(k), k)
 
 
         if irow is None: 
             iuuid = QUuid.createUuid().toString()
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'].append({
+            self.journal.append(self.tempSettings['toolbars'][tuuid][subpanel]['items'], {
                 'uuid': iuuid,
                 'alias': 'Item '+iuuid,
                 'reactions':[{
@@ -310,30 +473,37 @@ class ToolBarUI(Extension):
                     'dockers':[],
                     'config':{}
                     }]
-                })
+                }, tuuid)
             irow = len(self.tempSettings['toolbars'][tuuid][subpanel]['items'])-1
-            self.itemState = None
-        else:
-            self.itemState = copy.deepcopy(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow])
 
 
         
-        model = QStandardItemModel()
+        model = SettingsListModel(
+            lambda: self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'],
+            lambda v: v['alias'],
+            key=lambda v: v['uuid'], userData=lambda v: tuuid, parent=dlg )
         dlg.centralWidget.reactionListView.setModel(model)
 
 
-        actionModel = QStandardItemModel()
+        actionModel = SettingsListModel(
+            lambda: self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][self.onConfigReaction]['actions'],
+            lambda v: v['name'],
+            userData=lambda v: v['name'],
+            decoration=lambda v: self.iconCache.icon(v['icon']) if v['icon'] != '' else None, parent=dlg )
         dlg.centralWidget.actionsListView.setModel(actionModel)
 
+        dockerModel = SettingsListModel(
+            lambda: self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][self.onConfigReaction]['dockers'],
+            lambda v: self.dockerIndex.title(self.activeWindow(), v['name']),
+            userData=lambda v: v['name'], parent=dlg )
+        dlg.centralWidget.dockerListView.setModel(dockerModel)
 
 
-        def fillReactions(select = 0):
-            model.clear()
-            for (i,v) in enumerate(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions']):
-                item = QStandardItem(v['alias'])
-                item.setData(tuuid, Qt.UserRole+1)
-                model.appendRow(item)
-                if i == select: dlg.centralWidget.reactionListView.selectionModel().select( model.indexFromItem(item), QItemSelectionModel.Select )
+
+        def fillReactions(select = None):
+            model.sync()
+            if select is not None:
+                self.selectRow(dlg.centralWidget.reactionListView, select)
         
         
 
@@ -341,40 +511,45 @@ class ToolBarUI(Extension):
         def updateReactionChanges():
             srow = self.onConfigReaction
 
-            self.saveForm(dlg.centralWidget.reactionGroup, self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['config'])
+            self.saveForm(dlg, self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['config'], tuuid, 'reactionGroup')
             
-            rec = self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['alias'] = 'Reaction '+self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['uuid']
+            rec = Reaction.compile(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow], 'reaction')
+            alias = 'Reaction '+rec.uuid
             
-            if rec['config']['reactionTypeCmb'] == 'Action Collection':
-                if len(rec['actions']) > 1:
-                    self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['alias'] = rec['config']['reactionOpenByCmb'] + ' - Action List['+str(len(rec['actions']))+']: ' + rec['actions'][0]['name']
-                elif len(rec['actions']) == 1:
-                    self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['alias'] = rec['config']['reactionOpenByCmb'] + ' - Action: ' + rec['actions'][0]['name']
+            if rec.type == 'Action Collection':
+                if len(rec.actions) > 1:
+                    alias = rec.openBy + ' - Action List['+str(len(rec.actions))+']: ' + rec.actions[0].name
+                elif len(rec.actions) == 1:
+                    alias = rec.openBy + ' - Action: ' + rec.actions[0].name
+            elif rec.type == 'Dockers Collection' and rec.dockers:
+                alias = rec.openBy + ' - Dockers['+str(len(rec.dockers))+']: ' + self.dockerIndex.title(self.activeWindow(), rec.dockers[0]['name'])
+            self.journal.set(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow], 'alias', alias, tuuid)
 
             
             if len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions']) > 0 and len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][0]['actions']) > 0:
-                self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['alias']=self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][0]['actions'][0]['name']
+                self.journal.set(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow], 'alias', self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][0]['actions'][0]['name'], tuuid)
+            elif len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions']) > 0 and len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][0]['dockers']) > 0:
+                self.journal.set(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow], 'alias', self.dockerIndex.title(self.activeWindow(), self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][0]['dockers'][0]['name']), tuuid)
+            
+            # keep the updated reaction, further edits get a fresh scope
+            self.journal.commit()
+            self.journal.begin()
             #self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['config']['reactionCloseByCmb']='hover'
             #print ( "SAVE" , srow, self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'] )
             fillReactions(srow)
         
         def addReaction():
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][self.onConfigReaction]=self.reactionState
-            
             self.configReaction(dlg, tuuid, subpanel, irow)
 
             fillReactions( len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'])-1 )
             
         def editReaction(sel,desl):
+            if not sel.indexes(): return
             srow = sel.indexes()[0].row()
-            
-            if desl:
-                self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][self.onConfigReaction]=self.reactionState
-
            
             self.configReaction(dlg, tuuid, subpanel, irow,  srow)
             fillActions()
+            fillDockers()
             #fillReactions()
         
 
@@ -382,31 +557,28 @@ class ToolBarUI(Extension):
 
 
         
-        dlg.centralWidget.reactionTypeCmb.currentIndexChanged.connect(dlg.centralWidget.stackedWidget.setCurrentIndex)
-        dlg.centralWidget.reactionUpdateBtn.clicked.connect(updateReactionChanges)
+        dlg.connect(dlg.centralWidget.reactionUpdateBtn.clicked, updateReactionChanges)
         
 
-        dlg.centralWidget.reactionAddBtn.clicked.connect( addReaction )
-        dlg.centralWidget.reactionListView.selectionModel().selectionChanged.connect( editReaction )
+        dlg.connect(dlg.centralWidget.reactionAddBtn.clicked, addReaction)
+        dlg.connect(dlg.centralWidget.reactionListView.selectionModel().selectionChanged, editReaction)
         
 
         def fillActions(select = 0):
-            srow = self.onConfigReaction
-            actionModel.clear()
-            for (i,v) in enumerate(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions']):
-                item = QStandardItem(Krita.instance().icon(v['icon']),v['name']) if v['icon'] != '' else QStandardItem(v['name'])
-                item.setData(v['name'], Qt.UserRole+1)
-                actionModel.appendRow(item)
-                if i == select: dlg.centralWidget.actionsListView.selectionModel().select( actionModel.indexFromItem(item), QItemSelectionModel.Select )
+            actionModel.sync()
+            if select is not None:
+                self.selectRow(dlg.centralWidget.actionsListView, select)
         
         def addAction():
             srow = self.onConfigReaction
             action = self.getAction()
+            if action is None:
+                return
             
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'].append({
+            self.journal.append(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'], {
                 'name': action[0],
                 'icon': '' if action[1].startswith('[') else action[1]
-                })
+                }, tuuid)
             
             fillActions(len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'])-1)
             
@@ -414,348 +586,833 @@ class ToolBarUI(Extension):
             srow = self.onConfigReaction
             idx = dlg.centralWidget.actionsListView.selectionModel().selectedIndexes()
             if idx and idx[0]:
-                self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'].pop(idx[0].row())
-            fillActions(idx[0].row()-1)
+                self.journal.pop(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'], idx[0].row(), tuuid)
+                fillActions(idx[0].row()-1)
             
         def upAction():
             srow = self.onConfigReaction
             idx = dlg.centralWidget.actionsListView.selectionModel().selectedIndexes()
             if idx and idx[0]:
                 
-                fillActions(self.swapOrder(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'],idx[0].row(),-1))
+                fillActions(self.swapOrder(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'],idx[0].row(),-1,tuuid))
                 
         def downAction():
             srow = self.onConfigReaction
             idx = dlg.centralWidget.actionsListView.selectionModel().selectedIndexes()
             if idx and idx[0]:
                 
-                fillActions(self.swapOrder(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'],idx[0].row(),1))
+                fillActions(self.swapOrder(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['actions'],idx[0].row(),1,tuuid))
             
 
-        dlg.centralWidget.actionAddBtn.clicked.connect(addAction)
-        dlg.centralWidget.actionRemoveBtn.clicked.connect(removeAction)
-        dlg.centralWidget.actionOrderUpBtn.clicked.connect(upAction)
-        dlg.centralWidget.actionOrderDownBtn.clicked.connect(downAction)
+        dlg.connect(dlg.centralWidget.actionAddBtn.clicked, addAction)
+        dlg.connect(dlg.centralWidget.actionRemoveBtn.clicked, removeAction)
+        dlg.connect(dlg.centralWidget.actionOrderUpBtn.clicked, upAction)
+        dlg.connect(dlg.centralWidget.actionOrderDownBtn.clicked, downAction)
+        
+        def fillDockers(select = None):
+            dockerModel.sync()
+            if select is not None:
+                self.selectRow(dlg.centralWidget.dockerListView, select)
+        
+        def addDocker():
+            srow = self.onConfigReaction
+            name = self.getDocker()
+            if name is not None:
+                self.journal.append(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['dockers'], {
+                    'name': name,
+                    'icon': ''
+                    }, tuuid)
+                fillDockers(len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['dockers'])-1)
+        
+        def removeDocker():
+            srow = self.onConfigReaction
+            idx = dlg.centralWidget.dockerListView.selectionModel().selectedIndexes()
+            if idx and idx[0]:
+                self.journal.pop(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['dockers'], idx[0].row(), tuuid)
+                fillDockers(idx[0].row()-1)
         
-        fillReactions()
+        dlg.connect(dlg.centralWidget.dockerAddBtn.clicked, addDocker)
+        dlg.connect(dlg.centralWidget.dockerRemoveBtn.clicked, removeDocker)
+        
+        fillReactions(0)
 
         def updateChanges():
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][self.onConfigReaction]=self.reactionState
             #self.saveForm(dlg.centralWidget, self.tempSettings['toolbars'][tuuid]['config'])
             dlg.accept()
         
-        def cancelChanges():
-            if self.itemState is None:
-                self.tempSettings['toolbars'][tuuid][subpanel]['items'].pop(irow)
-            else:
-                self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow] = self.itemState
-            dlg.reject()
+        dlg.connect(dlg.btns.accepted, updateChanges)
+        accepted = dlg.exec() == QDialog.Accepted
+        self.releaseDialog(dlg)
         
-        dlg.btns.accepted.connect(updateChanges)
-        dlg.btns.rejected.connect(cancelChanges)
-        dlg.exec()
+        # reaction edits that were not updated are dropped either way
+        if self.reactionScope:
+            self.journal.rollback()
+            self.reactionScope = False
+        
+        if accepted:
+            self.journal.commit()
+        else:
+            self.journal.rollback()
         
         
     def configReaction(self, dlg, tuuid, subpanel, irow, srow = None):
 
+        if self.reactionScope:
+            self.journal.rollback()
+            self.reactionScope = False
+        
         if srow is not None: 
             #print ("LOAD", self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'] )
-            self.loadForm(dlg.centralWidget,self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['config'])
+            self.loadForm(dlg,self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow]['config'], 'reactionGroup')
             
         else:
             ruuid = QUuid.createUuid().toString()
-            self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'].append({
+            self.journal.append(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'], {
                 'uuid': ruuid,
                 'alias': 'Reaction '+ruuid,
                 'actions':[],
                 'dockers':[],
                 'config':{}
-                })
+                }, tuuid)
             srow = len(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'])-1
         
         self.onConfigReaction = srow
-        self.reactionState = copy.deepcopy(self.tempSettings['toolbars'][tuuid][subpanel]['items'][irow]['reactions'][srow])
+        # edits to the reaction stay in their own scope until 'Update Reaction'
+        self.journal.begin()
+        self.reactionScope = True
 
 
             
 
         #dlg.centralWidget.reactionUpdateBtn.clicked.disconnect()
 
+    def getDocker(self):
+        # object name of a docker of the active window
+        qwin = self.activeWindow()
+        docks = sorted( self.dockerIndex.docks(qwin).values(), key=lambda d: d.windowTitle() ) if qwin is not None else []
+        titles = [ d.windowTitle() for d in docks ]
+        (title, ok) = QInputDialog.getItem(None, "Dockers", "Docker:", titles, 0, False)
+        if ok and title in titles:
+            return docks[titles.index(title)].objectName()
+        return None
+
     def getAction(self, action = None):
-        dlg = self.dialog('ActionPicker', False)
+        dlg = self.dialog('ActionPicker')
         
         tableView = dlg.centralWidget.actionsTableView
             
-        tableModel = QStandardItemModel()
-        proxyModel = QSortFilterProxyModel()
-        tableModel.setHorizontalHeaderLabels(['Name', 'Description'])
-
-        proxyModel.setSourceModel(tableModel)
-        tableView.setModel(proxyModel)
-            
-        proxyModel.setFilterCaseSensitivity( Qt.CaseInsensitive )
-        proxyModel.setFilterKeyColumn(-1)
-            
-        parentItem = tableModel.invisibleRootItem()
-                
-        for action in  Krita.instance().actions():
-            parentItem.appendRow([
-                QStandardItem( action.objectName() ), 
-                QStandardItem( action.icon(), action.toolTip() )
-            ])
+        # the catalog and its model are shared by every opening of the picker
+        if self.actionModel is None:
+            self.actionModel = ActionTableModel(self.actionCatalog, self.iconCache, self)
+        
+        self.actionModel.setFilter('')
+        tableView.setModel(self.actionModel)
+        # index the actions once the picker is shown rather than on the first keystroke
+        QTimer.singleShot(0, self.actionCatalog.searchIndex)
 
-        dlg.centralWidget.actionsFilter.textChanged.connect(proxyModel.setFilterFixedString)
+        # the catalog's search index ranks the matches
+        dlg.connect(dlg.centralWidget.actionsFilter.textChanged, self.actionModel.setFilter)
         
 
         
         def iconPicker():
-            dlg.centralWidget.iconLabel.setText( self.getIcon() )
+            icon = self.getIcon()
+            if icon is not None:
+                dlg.centralWidget.iconLabel.setText(icon)
             
         def iconClear():
             dlg.centralWidget.iconLabel.setText( '[Default Icon]' )
         
-        dlg.centralWidget.iconPickBtn.clicked.connect(iconPicker)
-        dlg.centralWidget.iconClearBtn.clicked.connect(iconClear)
+        dlg.connect(dlg.centralWidget.iconPickBtn.clicked, iconPicker)
+        dlg.connect(dlg.centralWidget.iconClearBtn.clicked, iconClear)
         
         def updateChanges():
             dlg.accept()
         
-        dlg.btns.accepted.connect(updateChanges)
-        dlg.exec()
-        return [tableView.selectionModel().selectedRows()[0].data(0), dlg.centralWidget.iconLabel.text()]
+        dlg.connect(dlg.btns.accepted, updateChanges)
+        try:
+            rows = tableView.selectionModel().selectedRows() if dlg.exec() else []
+            return [rows[0].data(0), dlg.centralWidget.iconLabel.text()] if rows else None
+        finally:
+            self.releaseDialog(dlg)
         
     def getIcon(self, icon = None):
-        dlg = self.dialog('IconPicker', False)
+        dlg = self.dialog('IconPicker')
         
        
         listView = dlg.centralWidget.iconsListView
         
-        listView.setGridSize( QSize(128,128) )
-        
-        listModel = QStandardItemModel()
-        proxyModel = QSortFilterProxyModel()
+        if self.iconCatalog is None:
+            self.iconCatalog = IconCatalog(Krita.instance().version(), self.VERSION, os.path.dirname(os.path.realpath(__file__)) + '/ThemeIcons.txt')
+        if self.iconRenderer is None:
+            self.iconRenderer = IconRenderer(parent=self)
 
-        proxyModel.setSourceModel(listModel)
-        listView.setModel(proxyModel)
-        
-        proxyModel.setFilterCaseSensitivity( Qt.CaseInsensitive )
+        listModel = IconListModel(Krita.instance().icon, self.iconPreviewCache, self.iconRenderer, self.iconCatalog.paths)
+        listModel.setIconSize(listView.iconSize(), listView.devicePixelRatioF())
+        listView.setModel(listModel)
         
 
         def loadIconList():
-            iconDict = {}
-            
-            listModel.clear()
-            
-            iconFormats = ["*.svg","*.svgz","*.svz","*.png"]
-            
-            if dlg.centralWidget.boolIconsKrita.isChecked():
-                iconList = QDir(":/pics/").entryList(iconFormats, QDir.Files)
-                iconList += QDir(":/").entryList(iconFormats, QDir.Files)
-                
-                for iconName in iconList:
-                    name = iconName.split('_',1)
-                    if any(iconSize == name[0] for iconSize in [ '16', '22', '24', '32', '48', '64', '128', '256', '512', '1048' ]):
-                        iconName = name[1]
-                        
-                    name = iconName.split('_',1)
-                    if any(iconSize == name[0] for iconSize in [ 'light', 'dark' ]):
-                        iconName = name[1]
-                        
-                    name = iconName.split('.')
-                    iconName = name[0]
-                    iconDict[iconName]={}
-                
-            if dlg.centralWidget.boolIconsKritaExtra.isChecked():
-                iconList = QDir(":/icons/").entryList(iconFormats, QDir.Files)
-                #iconList += QDir(":/images/").entryList(iconFormats, QDir.Files)
-
-                for iconName in iconList:
-                    name = iconName.split('.')
-                    iconName = name[0]
-                    iconDict[iconName]={}
-
-
-            if dlg.centralWidget.boolIconsTheme.isChecked():
-                with open( os.path.dirname(os.path.realpath(__file__)) + '/ThemeIcons.txt' ) as f:
-                    for iconName in f.readlines():
-                        iconDict[iconName.rstrip()]={}
-
+            # the catalog is scanned (or read from its cache) once, typing or toggling a
+            # source only filters it
+            sources = 0
+            if dlg.centralWidget.boolIconsKrita.isChecked(): sources |= ICONS_KRITA
+            if dlg.centralWidget.boolIconsKritaExtra.isChecked(): sources |= ICONS_KRITA_EXTRA
+            if dlg.centralWidget.boolIconsTheme.isChecked(): sources |= ICONS_THEME
             
-            for iconName, iconInfo in sorted(iconDict.items()):
-                    item = QStandardItem( Krita.instance().icon(iconName), iconName )
-                    
-                    listModel.appendRow( item )
+            listModel.setNames( self.iconCatalog.search(dlg.centralWidget.iconsFilter.text(), sources) )
 
 
         loadIconList()
 
-        iconsGroup = QButtonGroup(dlg.centralWidget)
-        iconsGroup.setExclusive(False)
-        
-        iconsGroup.addButton( dlg.centralWidget.boolIconsKrita )
-        iconsGroup.addButton( dlg.centralWidget.boolIconsKritaExtra )
-        iconsGroup.addButton( dlg.centralWidget.boolIconsTheme )
-
-        iconsGroup.buttonToggled.connect(loadIconList)
-        dlg.centralWidget.iconsFilter.textChanged.connect(proxyModel.setFilterFixedString)
+        dlg.connect(dlg.iconsGroup.buttonToggled, loadIconList)
+        dlg.connect(dlg.centralWidget.iconsFilter.textChanged, loadIconList)
     
     
         def updateChanges():
             dlg.accept()
         
-        dlg.btns.accepted.connect(updateChanges)
-        dlg.exec()
-        
-        return listView.selectionModel().selectedIndexes()[0].data(0)
+        dlg.connect(dlg.btns.accepted, updateChanges)
+        try:
+            indexes = listView.selectionModel().selectedIndexes() if dlg.exec() else []
+            return indexes[0].data(0) if indexes else None
+        finally:
+            self.iconRenderer.cancel()
+            self.iconRenderer.rendered.disconnect(listModel.iconsRendered)
+            self.releaseDialog(dlg)
     
-    def swapOrder(self, item, row, i):
+    def selectRow(self, view, row):
+        index = view.model().index(row, 0)
+        if index.isValid():
+            view.selectionModel().select(index, QItemSelectionModel.ClearAndSelect)
+
+    def swapOrder(self, item, row, i, tag=None):
         if i == -1 and row > 0:
-            item[row-1], item[row] = item[row], item[row-1]
+            (a, b) = (item[row], item[row-1])
+            self.journal.set(item, row-1, a, tag)
+            self.journal.set(item, row, b, tag)
             return row-1
         elif i == 1 and row < len(item)-1:
-            item[row], item[row+1] = item[row+1], item[row]
+            (a, b) = (item[row+1], item[row])
+            self.journal.set(item, row, a, tag)
+            self.journal.set(item, row+1, b, tag)
             return row+1
         return row
 
     
-    def loadForm(self, form, items):
-        for (k, v) in items.items():
-            w = getattr(form,k)
-            if isinstance(w,QLineEdit):
-                w.setText(v)
-            elif isinstance(w,QSpinBox):
-                w.setValue(v)
-            elif isinstance(w,QComboBox):
-                if w.currentData():
-                    w.setCurrentIndex(w.findData(v))
-                else:
-                    w.setCurrentIndex(w.findText(v))
-
-    def saveForm(self, form, items):
-        for w in form.findChildren(QWidget):
-            if '_' not in w.objectName():
-                if isinstance(w,QLineEdit):
-                    items[w.objectName()]=w.text()
-                elif isinstance(w,QSpinBox):
-                    items[w.objectName()]=w.value()
-                elif isinstance(w,QComboBox):
-                    if w.currentData():
-                        items[w.objectName()]=w.currentData()
-                    else:
-                        items[w.objectName()]=w.currentText()
+    def loadForm(self, dlg, items, scope=None):
+        # unknown keys are skipped, see FormBinding
+        dlg.binding.load(items, scope)
+
+    def saveForm(self, dlg, items, tag=None, scope=None):
+        # only fields edited since the last load or save (or missing from
+        # items) are compared
+        for (k, v) in dlg.binding.changes(items, scope):
+            self.journal.set(items, k, v, tag)
                 
 
-    def registerToolBars(self):
-        toolbars={}
-        tmap = {}
-        
-        for sig in self.boundActions:
-            QObject.disconnect(sig)
-        
-        for tuuid in self.settings['toolbars'].keys():
-            tmap[self.settings['toolbars'][tuuid]['config']['toolbarName']]=tuuid
+    def registerToolBars(self, qwin=None):
+        for qwin in ([qwin] if qwin is not None else list(self.windows)):
+            self.registerWindowToolBars(qwin)
 
-        for w in self.qwin.children(): 
-            if isinstance(w,QToolBar):
-                name = w.objectName()
-                if name.startswith('ToolBarUI: '):
-                    name = name.split('ToolBarUI: ')[1]
-                    toolbars[tmap[name]]=w
+    def registerWindowToolBars(self, qwin):
+        # panels are found by uuid; the object name derives from the uuid
+        # too, so Krita's saved window state follows a toolbar across renames
+        toolbars = self.windows[qwin]
         
         for tuuid in self.settings['toolbars'].keys():
-            if tuuid not in toolbars.keys():
-                toolbar = ToolBarUIPanel('ToolBarUI: '+self.settings['toolbars'][tuuid]['config']['toolbarName'], tuuid, self, self.qwin)
-            
-                self.qwin.addToolBar(toolbar)
-                self.toolBars[tuuid]=toolbar
+            name = self.settings['toolbars'].name(tuuid)
+            toolbar = toolbars.get(tuuid)
+            if toolbar is None:
+                toolbar = ToolBarUIPanel(name, tuuid, self, qwin)
+                qwin.addToolBar(toolbar)
+                toolbars[tuuid] = toolbar
+            elif toolbar.windowTitle() != name:
+                toolbar.setWindowTitle(name)
+        
+        for tuuid in [ tuuid for tuuid in toolbars if tuuid not in self.settings['toolbars'] ]:
+            self.removeToolBar(qwin, tuuid)
+    
+    def removeToolBar(self, qwin, tuuid):
+        toolbar = self.windows[qwin].pop(tuuid)
+        self.idle.cancel(('build', toolbar))
+        self.dropOverlay(toolbar)
+        if toolbar.slide is not None:
+            toolbar.slide.deleteLater()
+        for button in list(toolbar.itemActions):
+            button.unbind()
+        qwin.removeToolBar(toolbar)
+        toolbar.deleteLater()
     
     
     def buildToolBars(self):
-        for tuuid in self.settings['toolbars'].keys():
-            self.toolBars[tuuid].clear()
-            self.buildItems(tuuid)
-            
-    def buildItems(self, tuuid):
-        t = self.toolBars[tuuid]
-        s = self.settings['toolbars'][tuuid]
-        
-        for panel in ('top','bottom'):
-            for i, iv in enumerate(s[panel]['items']):
-                t.addItem(panel, iv)
-
-            
-            
-            
+        # Reconcile each panel against the settings instead of clearing it,
+        # so only the buttons whose item changed are created/removed/moved.
+        stats = { 'created':0, 'reused':0, 'updated':0, 'moved':0, 'removed':0 }
+        
+        # every window reconciles against the same compiled layout
+        for (tuuid, t) in self.panels():
+            self.idle.cancel(('build', t))
+            if not self.isDeferred(tuuid, t):
+                self.buildItems(t, stats)
+        
+        stats['touched'] = stats['created'] + stats['reused'] + stats['updated'] + stats['moved'] + stats['removed']
+        self.reconcileStats = stats
+        self.popups.retain( self.popupKeys() )
+        return stats['touched']
+    
+    def popupKeys(self):
+        return set( (t.qwin, r.uuid) for (tuuid, t) in self.panels() for button in t.itemActions for r in button.s.reactions )
+    
+    def iconsInvalidated(self):
+        # the theme changed, the buttons pick up the new icons
+        self.iconPreviewCache.clear()
+        self.popups.clear()
+        for (tuuid, t) in self.panels():
+            for button in t.itemActions:
+                button.refreshIcon()
+            t.snapshot = None
+    
+    def accounting(self):
+        # per toolbar counts, plus the action connections shared by all of them
+        counts = { 'windows':[ { tuuid:t.accounting() for tuuid, t in toolBars.items() } for toolBars in self.windows.values() ] }
+        counts['actionConnections'] = self.stateHub.connections()
+        counts['popups'] = len(self.popups)
+        return counts
             
+    def buildItems(self, t, stats):
+        try:
+            s = self.layout.toolbars.get(t.uuid)
+        except (SettingsError, LayoutError, ValueError) as e:
+            print ("ToolBarUI: skipping toolbar", t.uuid, e)
+            return
+        
+        t.reconcile(s, stats)
+
+    def placeToolBar(self, t):
+        # reactive and drawer toolbars are children of the window laid over
+        # it instead of sitting in a toolbar area, hidden until revealed
+        s = t.compiled
+        kind = s.type if s is not None else 'default'
+        overlay = kind in self.REACTIVE_TYPES or kind in self.DRAWER_TYPES
+        if overlay != t.overlay:
+            t.overlay = overlay
+            # an overlay has no toolbar area to be dragged to
+            t.setMovable(not overlay)
+            if overlay:
+                t.qwin.removeToolBar(t)
+                t.setParent(t.qwin)
+            else:
+                self.dropOverlay(t)
+                t.qwin.addToolBar(t)
+                t.show()
+        if overlay:
+            t.setOrientation(Qt.Vertical if s.position in ('Left', 'Right') else Qt.Horizontal)
+            self.placeOverlay(t)
+    
+    def dropOverlay(self, t):
+        self.proximity.removeZone(t)
+        self.timers.cancel(('reveal', t))
+        self.timers.cancel(('conceal', t))
+        if t.slide is not None:
+            t.slide.animation.stop()
+            t.slide.hide()
+        if t.handle is not None:
+            t.handle.deleteLater()
+            t.handle = None
+        t.snapshot = None
+    
+    def placeOverlays(self, qwin):
+        for t in self.windows.get(qwin, {}).values():
+            if t.overlay:
+                self.placeOverlay(t)
+    
+    def placeOverlay(self, t):
+        # against the configured edge of the central area, centered along it
+        central = t.qwin.centralWidget()
+        area = central.geometry() if central is not None else t.qwin.rect()
+        size = t.sizeHint().boundedTo(area.size())
+        edge = t.compiled.position
+        if edge == 'Top':
+            pos = QPoint(area.center().x() - size.width() // 2, area.top())
+        elif edge == 'Left':
+            pos = QPoint(area.left(), area.center().y() - size.height() // 2)
+        elif edge == 'Right':
+            pos = QPoint(area.right() - size.width() + 1, area.center().y() - size.height() // 2)
+        else:
+            pos = QPoint(area.center().x() - size.width() // 2, area.bottom() - size.height() + 1)
+        pos.setX(max(area.left(), pos.x()))
+        pos.setY(max(area.top(), pos.y()))
+        if t.size() != size:
+            t.snapshot = None
+        t.setGeometry(QRect(pos, size))
+        
+        if t.compiled.type in self.REACTIVE_TYPES:
+            m = self.REACTIVE_MARGIN
+            self.proximity.setZone(t, t.qwin, t.geometry().adjusted(-m, -m, m, m))
+        else:
+            self.proximity.removeZone(t)
+        
+        # a plain drawer is opened and closed with a handle on the edge
+        if t.compiled.type in self.DRAWER_TYPES and t.compiled.type not in self.REACTIVE_TYPES:
+            if t.handle is None:
+                t.handle = QToolButton(t.qwin)
+                t.handle.setAutoRaise(True)
+                t.handle.clicked.connect( functools.partial(self.toggleDrawer, t) )
+            self.placeHandle(t)
+        elif t.handle is not None:
+            t.handle.deleteLater()
+            t.handle = None
+    
+    def placeHandle(self, t):
+        if t.handle is None:
+            return
+        edge = t.compiled.position
+        opened = t.isVisible() or t.slide is not None and t.slide.isRunning() and t.slide.opening
+        g = t.geometry()
+        arrows = { 'Top':(Qt.DownArrow, Qt.UpArrow), 'Left':(Qt.RightArrow, Qt.LeftArrow), 'Right':(Qt.LeftArrow, Qt.RightArrow) }
+        t.handle.setArrowType( arrows.get(edge, (Qt.UpArrow, Qt.DownArrow))[1 if opened else 0] )
+        if edge in ('Left', 'Right'):
+            t.handle.setFixedSize(12, 32)
+            if edge == 'Left':
+                x = g.right() + 1 if opened else g.left()
+            else:
+                x = g.left() - 12 if opened else g.right() - 11
+            t.handle.move(x, g.center().y() - 16)
+        else:
+            t.handle.setFixedSize(32, 12)
+            if edge == 'Top':
+                y = g.bottom() + 1 if opened else g.top()
+            else:
+                y = g.top() - 12 if opened else g.bottom() - 11
+            t.handle.move(g.center().x() - 16, y)
+        t.handle.show()
+        t.handle.raise_()
+    
+    def reactiveEntered(self, t):
+        self.timers.cancel(('conceal', t))
+        delay = t.compiled.openTimeout or self.layout.openTimeout
+        if delay > 0:
+            self.timers.schedule(('reveal', t), delay / 1000, functools.partial(self.revealToolBar, t))
+        else:
+            self.revealToolBar(t)
+    
+    def reactiveLeft(self, t):
+        self.timers.cancel(('reveal', t))
+        delay = t.compiled.closeTimeout or self.layout.closeTimeout
+        self.timers.schedule(('conceal', t), delay / 1000, functools.partial(self.concealToolBar, t))
+    
+    def revealToolBar(self, t):
+        if t.compiled.type in self.DRAWER_TYPES:
+            self.slideToolBar(t, True)
+        else:
+            t.show()
+            t.raise_()
+    
+    def concealToolBar(self, t):
+        if t.compiled.type in self.DRAWER_TYPES:
+            self.slideToolBar(t, False)
+        else:
+            t.hide()
+    
+    def toggleDrawer(self, t, checked=False):
+        opening = t.slide is not None and t.slide.isRunning() and t.slide.opening
+        self.slideToolBar(t, not (t.isVisible() or opening))
+    
+    def slideToolBar(self, t, opening):
+        if t.slide is None:
+            t.slide = DrawerSlide(t.qwin)
+            t.slide.finished.connect( functools.partial(self.slideFinished, t) )
+        running = t.slide.isRunning()
+        if opening == ((t.isVisible() and not running) or (running and t.slide.opening)):
+            return
+        pixmap = self.toolBarSnapshot(t)
+        t.hide()
+        t.slide.slide(pixmap, t.geometry(), t.compiled.position, opening)
+        self.placeHandle(t)
     
+    def slideFinished(self, t, opening):
+        if opening:
+            t.show()
+            t.raise_()
+        self.placeHandle(t)
+    
+    def toolBarSnapshot(self, t):
+        # kept until the toolbar's content or size changes
+        if t.snapshot is None:
+            t.layout().activate()
+            t.snapshot = t.grab()
+        return t.snapshot
+
     def setup(self):
         pass
 
 
 class ToolBarUIPanel(QToolBar):
+    BUTTON_POOL = 16
+    # button size hints by icon size, see buttonExtent
+    EXTENTS = {}
+    
     def __init__(self, name, uuid, caller, parent=None):
         super().__init__()
         self.caller = caller
-        self.setObjectName(name)
+        self.qwin = parent
+        # laid over the window instead of docked, see placeToolBar
+        self.overlay = False
+        # drawer types: the slide animation, the snapshot it slides and the
+        # handle opening a plain drawer
+        self.slide = None
+        self.snapshot = None
+        self.handle = None
+        self.setObjectName('ToolBarUI: ' + uuid)
+        self.setWindowTitle(name)
         self.uuid = uuid
         self.items = { 
             'top':[],
             'bottom':[]
             }
-        
-    def addItem(self, panel, item):
-        self.items[panel].append(ToolBarUIButton(item, self))
-        self.addWidget(self.items[panel][-1])
+        self.itemActions = {}
+        self.built = False
+        self.skeleton = None
+        # removed buttons kept with their widget action for reuse
+        self.spareActions = {}
+        # the compiled Toolbar the buttons were reconciled against
+        self.compiled = None
+        self.openByDefault = None
+        
+    def removeItem(self, button):
+        button.unbind()
+        action = self.itemActions.pop(button)
+        self.removeAction(action)
+        if len(self.spareActions) < self.BUTTON_POOL:
+            self.spareActions[button] = action
+        else:
+            # the widget action owns the button, deleting it deletes both
+            action.deleteLater()
+
+    def acquireButton(self, item, stats):
+        if self.spareActions:
+            (button, action) = self.spareActions.popitem()
+            # placed by arrange() like a moved button
+            self.itemActions[button] = action
+            button.bind(item)
+            stats['reused'] += 1
+        else:
+            button = ToolBarUIButton(item, self)
+            stats['created'] += 1
+        return button
+
+    def accounting(self):
+        """Live widgets, action state subscriptions and popups of this toolbar."""
+        buttons = list(self.itemActions)
+        visible = self.caller.popups.visible()
+        return {
+            'widgets': len(buttons),
+            'spare': len(self.spareActions),
+            'connections': sum( 1 for b in buttons if b.boundAction is not None ),
+            'popups': sum( 1 for b in buttons if b.popup in visible )
+            }
 
+    def reactionOpenBy(self, openBy):
+        if openBy == 'default' and self.compiled is not None:
+            openBy = self.compiled.openBy
+        if openBy == 'default':
+            openBy = self.caller.layout.openBy
+        return 'left' if openBy == 'default' else openBy
+
+    def reactionSetting(self, r, name):
+        # 'default' or 0 defers to the toolbar, then to the global config
+        value = getattr(r, name)
+        for fallback in (self.compiled, self.caller.layout):
+            if value not in ('default', 0) or fallback is None:
+                break
+            value = getattr(fallback, name)
+        return value
+
+    def applyButtonSize(self, s):
+        # intButtonSize is the icon size of the buttons, which follow the
+        # toolbar's; an invalid size gives the toolbar back its default
+        size = QSize(s.buttonSize, s.buttonSize) if s is not None and s.buttonSize else QSize()
+        if size.isValid() or self.compiled is not None and self.compiled.buttonSize:
+            self.setIconSize(size)
+
+    def buttonExtent(self):
+        # size of an icon button at the current icon size, measured once
+        key = (self.iconSize().width(), self.iconSize().height())
+        if key not in self.EXTENTS:
+            probe = QToolButton()
+            probe.setAutoRaise(True)
+            probe.setIconSize(self.iconSize())
+            self.EXTENTS[key] = probe.sizeHint()
+        return self.EXTENTS[key]
+
+    def showSkeleton(self, s):
+        # reserves the room the buttons will take until they are built
+        if s is None or self.skeleton is not None:
+            return
+        count = sum( 1 for item in s.items() )
+        if not count:
+            return
+        self.applyButtonSize(s)
+        size = self.buttonExtent()
+        placeholder = QWidget()
+        if self.orientation() == Qt.Horizontal:
+            placeholder.setFixedSize(size.width() * count, size.height())
+        else:
+            placeholder.setFixedSize(size.width(), size.height() * count)
+        self.skeleton = self.addWidget(placeholder)
+
+    def showEvent(self, event):
+        if not self.built:
+            self.caller.buildDeferred(self)
+        super().showEvent(event)
+
+    def reconcile(self, s, stats):
+        if self.skeleton is not None:
+            self.removeAction(self.skeleton)
+            self.skeleton.deleteLater()
+            self.skeleton = None
+        self.built = True
+        self.applyButtonSize(s)
+        self.compiled = s
+        touched = sum(stats.values())
+        openByDefault = self.reactionOpenBy('default')
+        rebind = openByDefault != self.openByDefault
+        self.openByDefault = openByDefault
+        
+        current = {}
+        for panel in ('top','bottom'):
+            for button in self.items[panel]:
+                current[button.s.uuid] = button
+        
+        items = { 
+            'top':[],
+            'bottom':[]
+            }
+        
+        # removed buttons go back to the pool first so they can be reused
+        # for the new items right away
+        wanted = set( iv.uuid for panel, iv in s.items() ) if s is not None else set()
+        for uuid in [ uuid for uuid in current if uuid not in wanted ]:
+            self.removeItem(current.pop(uuid))
+            stats['removed'] += 1
+        
+        if s is not None:
+            for panel, iv in s.items():
+                button = current.pop(iv.uuid, None)
+                if button is None:
+                    button = self.acquireButton(iv, stats)
+                elif rebind or button.s.reactions != iv.reactions or (button.text() and button.s.alias != iv.alias):
+                    button.bind(iv)
+                    stats['updated'] += 1
+                else:
+                    button.s = iv
+                items[panel].append(button)
+        
+        self.items = items
+        self.arrange(items['top'] + items['bottom'], stats)
+        if sum(stats.values()) != touched:
+            self.snapshot = None
+        self.caller.placeToolBar(self)
+
+    def arrange(self, buttons, stats):
+        # Buttons on the longest run already in order stay put, everything
+        # else is moved (or inserted) in front of its successor.
+        position = { a:i for i, a in enumerate(self.actions()) }
+        placed = [ b for b in buttons if self.itemActions.get(b) in position ]
+        keep = set( self.longestOrderedRun(placed, [ position[self.itemActions[b]] for b in placed ]) )
+        
+        before = None
+        for button in reversed(buttons):
+            if button in keep:
+                before = self.itemActions[button]
+                continue
+            
+            if button in self.itemActions:
+                action = self.itemActions[button]
+                if action in position:
+                    self.removeAction(action)
+                    stats['moved'] += 1
+                self.insertAction(before, action)
+            else:
+                action = self.insertWidget(before, button)
+                self.itemActions[button] = action
+            before = action
+
+    @staticmethod
+    def longestOrderedRun(values, keys):
+        tails = []
+        tailIdx = []
+        prev = [-1] * len(keys)
+        for i, k in enumerate(keys):
+            lo, hi = 0, len(tails)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if tails[mid] < k:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo > 0: prev[i] = tailIdx[lo-1]
+            if lo == len(tails):
+                tails.append(k)
+                tailIdx.append(i)
+            else:
+                tails[lo] = k
+                tailIdx[lo] = i
+        
+        run = []
+        i = tailIdx[-1] if tailIdx else -1
+        while i != -1:
+            run.append(values[i])
+            i = prev[i]
+        return run
 
         
+        
 
 class ToolBarUIButton(QToolButton):
+    TRIGGER = {
+        'hover':'hover',
+        'left':int(Qt.LeftButton),
+        'middle':int(Qt.MiddleButton),
+        'right':int(Qt.RightButton)
+        }
+
     def __init__(self, item, parent=None):
         super().__init__(parent)
         self.toolbar = parent
         self.s = item
         self.popup = None
+        self.boundAction = None
+        self.boundIcon = None
+        self.dispatch = {}
+        # like the toolbar's own buttons, follow its icon size
+        self.setIconSize(parent.iconSize())
+        parent.iconSizeChanged.connect(self.setIconSize)
         
-        if item['reactions'][0]['config']['reactionTypeCmb'] == 'Action Collection':
-            ra = item['reactions'][0]['actions'][0]
-            action = Krita.instance().action(ra['name'])
-            
-            self.setIcon(action.icon() if ra['icon'] == '' else Krita.instance().icon(ra['icon']))
-            self.setToolTip(action.toolTip())
-            
-            if action.isCheckable():
-                self.setCheckable(True)
-                if action.isChecked(): self.actionChanged(action, True)
-                self.toolbar.caller.boundActions.append( action.toggled.connect( functools.partial( self.actionChanged, action )  ) )
-            
+        self.bind(item)
 
-    def actionChanged(self, action, status):
+    def bind(self, item):
+        self.unbind()
+        self.s = item
+        
+        action = None
+        if item.reactions and item.reactions[0].type == 'Action Collection' and item.reactions[0].actions:
+            ra = item.reactions[0].actions[0]
+            # the action of this window, the shared entry only for its details
+            action = self.toolbar.caller.windowActions.action(self.toolbar.qwin, ra.name)
+            entry = self.toolbar.caller.actionCatalog.entry(ra.name) if action is not None else None
+            if action is not None and entry is None:
+                entry = ActionEntry(action)
+        
+        if action is None:
+            self.boundIcon = None
+            self.setIcon(QIcon())
+            self.setText(item.alias)
+            self.setToolTip(item.alias)
+            self.setCheckable(False)
+        else:
+            self.boundIcon = (ra, action)
+            self.setIcon(self.resolveIcon(ra, action))
+            self.setText('')
+            self.setToolTip(entry.toolTip)
+            
+            self.setCheckable(entry.checkable)
+            if entry.checkable:
+                self.boundAction = action
+                self.toolbar.caller.stateHub.subscribe(action, self)
+        
+        # trigger -> handlers with their actions already resolved, so events
+        # are a single lookup
+        self.dispatch = {}
+        for r in item.reactions:
+            trigger = self.TRIGGER.get( self.toolbar.reactionOpenBy(r.openBy) )
+            if trigger is not None:
+                self.dispatch.setdefault(trigger, []).append( (r, self.reactionHandler(r)) )
+
+    def resolveIcon(self, ra, action):
+        cache = self.toolbar.caller.iconCache
+        return cache.actionIcon(ra.name, action) if ra.icon == '' else cache.icon(ra.icon)
+
+    def refreshIcon(self):
+        if self.boundIcon is not None:
+            self.setIcon(self.resolveIcon(*self.boundIcon))
+
+    def reactionHandler(self, r):
+        entries = []
+        if r.type == 'Action Collection':
+            for ra in r.actions:
+                action = self.toolbar.caller.windowActions.action(self.toolbar.qwin, ra.name)
+                if action is not None: entries.append( (ra, action) )
+            if len(entries) == 1:
+                return entries[0][1].trigger
+            if entries:
+                self.toolbar.caller.popups.prepare((self.toolbar.qwin, r.uuid), r, entries, self.popupButtonSize())
+        elif r.type == 'Dockers Collection':
+            return functools.partial(self.openDockers, r)
+        return functools.partial(self.openItem, r, entries)
+
+    def popupButtonSize(self):
+        return self.toolbar.iconSize().width()
+
+    def unbind(self):
+        for r in self.s.reactions:
+            self.toolbar.caller.timers.cancel( ('open', self, r.uuid) )
+        if self.popup is not None:
+            # the popup belongs to the PopupCache, the button only knows its key
+            self.toolbar.caller.popups.close(self.popup)
+            self.popup = None
+        if self.boundAction is not None:
+            self.toolbar.caller.stateHub.unsubscribe(self.boundAction, self)
+            self.boundAction = None
+
+    def actionChanged(self, status):
+        if status != self.isChecked():
+            # the drawer snapshot shows the old state
+            self.toolbar.snapshot = None
         self.setChecked(status)
     
     def enterEvent(self, event):
-        for (i,r) in enumerate(self.s['reactions']):
-            if r['config']['reactionOpenByCmb'] == 'hover':
-                self.openItem(r)
+        # hover intent: the reaction runs if the pointer is still here after
+        # its open delay, re-entering restarts the delay
+        for (r, handler) in self.dispatch.get('hover', ()):
+            delay = self.toolbar.reactionSetting(r, 'openTimeout')
+            if delay > 0:
+                self.toolbar.caller.timers.schedule( ('open', self, r.uuid), delay / 1000, handler )
+            else:
+                handler()
+    
+    def leaveEvent(self, event):
+        for (r, handler) in self.dispatch.get('hover', ()):
+            self.toolbar.caller.timers.cancel( ('open', self, r.uuid) )
     
     def mousePressEvent(self, event):
-        for (i,r) in enumerate(self.s['reactions']):
-            if event.buttons() == Qt.LeftButton and r['config']['reactionOpenByCmb'] == 'left':
-                self.openItem(r)
-            if event.buttons() == Qt.MiddleButton and r['config']['reactionOpenByCmb'] == 'middle':
-                self.openItem(r)
-            elif event.buttons() == Qt.RightButton and r['config']['reactionOpenByCmb'] == 'right':
-                self.openItem(r)
+        for (r, handler) in self.dispatch.get(int(event.buttons()), ()):
+            handler()
                 
-    def openItem(self, r):
-        if r['config']['reactionTypeCmb'] == 'Action Collection':
-            if len(r['actions']) == 1:
-                Krita.instance().action( r['actions'][0]['name'] ).trigger()
-            else:
-                self.popup = QWidget()
-                grid = QGridLayout
-                self.popup.setLayout(grid)
-                print ("SHOW ACTIONS!")
+    def openItem(self, r, entries):
+        if r.type == 'Action Collection' and entries:
+            self.popup = (self.toolbar.qwin, r.uuid)
+            popup = self.toolbar.caller.popups.popup(self.popup, r, entries, self.popupButtonSize())
+            popup.openAt(self, self.toolbar.orientation(), self.closeDelay(r))
+
+    def openDockers(self, r):
+        # the dockers of this window, looked up by object name
+        index = self.toolbar.caller.dockerIndex
+        docks = [ dock for dock in ( index.dock(self.toolbar.qwin, v['name']) for v in r.dockers ) if dock is not None ]
+        popup = self.toolbar.caller.popups.dockerPopup((self.toolbar.qwin, r.uuid), r)
+        if not docks or popup.isVisible():
+            return
+        if popup.borrow(docks):
+            self.popup = (self.toolbar.qwin, r.uuid)
+            popup.openAt(self, self.toolbar.orientation(), self.closeDelay(r))
+
+    def closeDelay(self, r):
+        # popups close on a click outside them, 'Hover' also closes them
+        # once the pointer is away for the close delay
+        if self.toolbar.reactionSetting(r, 'closeBy') == 'hover':
+            return self.toolbar.reactionSetting(r, 'closeTimeout') / 1000
+        return None
 
 
 
@@ -0,0 +1,452 @@
+import os
+import json
+import time
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, QDir, QStandardPaths, pyqtSignal
+from PyQt5.QtGui import QGuiApplication
+from PyQt5.QtWidgets import QAction, QDockWidget
+from .ToolBarUISearch import SearchIndex
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+
+ICONS_KRITA = 1
+ICONS_KRITA_EXTRA = 2
+ICONS_THEME = 4
+
+ICON_FORMATS = ["*.svg","*.svgz","*.svz","*.png"]
+ICON_SIZES = ( '16', '22', '24', '32', '48', '64', '128', '256', '512', '1048' )
+ICON_THEMES = ( 'light', 'dark' )
+
+
+class IconCatalog:
+    """Every icon name the IconPicker can offer, tagged by source.
+
+    The resource scan runs once per Krita and plugin version and is cached
+    on disk; names(sources) then only filters the in-memory index. Each
+    entry is [sources, resource paths], the paths being the files the name
+    was found in (none for theme icons).
+    """
+    CACHE_VERSION = 1
+
+    def __init__(self, kritaVersion, pluginVersion, themeFile, cacheFile=None):
+        self.themeFile = themeFile
+        self.cacheFile = cacheFile or os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), 'ToolBarUI-icons.json')
+        self.key = [ self.CACHE_VERSION, kritaVersion, pluginVersion, self.fileStamp(themeFile) ]
+        self.icons = None
+        self.filtered = {}
+        self.index = None
+        self.stats = { 'source':None, 'time':0.0 }
+
+    @staticmethod
+    def fileStamp(path):
+        try:
+            st = os.stat(path)
+            return [ st.st_size, int(st.st_mtime) ]
+        except OSError:
+            return None
+
+    def load(self):
+        if self.icons is not None:
+            return self.icons
+
+        start = time.perf_counter()
+        try:
+            with open(self.cacheFile) as f:
+                cache = json.load(f)
+            if cache.get('key') == self.key:
+                self.icons = cache['icons']
+                self.stats['source'] = 'cache'
+        except (OSError, ValueError, KeyError):
+            pass
+
+        if self.icons is None:
+            self.icons = self.scan()
+            self.stats['source'] = 'scan'
+            try:
+                os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+                with open(self.cacheFile + '.tmp', 'w') as f:
+                    json.dump({ 'key':self.key, 'icons':self.icons }, f)
+                os.replace(self.cacheFile + '.tmp', self.cacheFile)
+            except OSError as e:
+                print ("ToolBarUI: could not cache the icon catalog,", e)
+
+        self.stats['time'] = time.perf_counter() - start
+        return self.icons
+
+    def add(self, icons, name, source, path=None):
+        entry = icons.setdefault(name, [0, []])
+        entry[0] |= source
+        if path is not None: entry[1].append(path)
+
+    def scan(self):
+        icons = {}
+
+        for folder in (":/pics/", ":/"):
+            for fileName in QDir(folder).entryList(ICON_FORMATS, QDir.Files):
+                iconName = fileName
+                name = iconName.split('_',1)
+                if name[0] in ICON_SIZES and len(name) > 1:
+                    iconName = name[1]
+
+                name = iconName.split('_',1)
+                if name[0] in ICON_THEMES and len(name) > 1:
+                    iconName = name[1]
+
+                self.add(icons, iconName.split('.')[0], ICONS_KRITA, folder + fileName)
+
+        for fileName in QDir(":/icons/").entryList(ICON_FORMATS, QDir.Files):
+            self.add(icons, fileName.split('.')[0], ICONS_KRITA_EXTRA, ":/icons/" + fileName)
+
+        try:
+            with open(self.themeFile) as f:
+                for iconName in f.readlines():
+                    if iconName.strip(): self.add(icons, iconName.strip(), ICONS_THEME)
+        except OSError as e:
+            print ("ToolBarUI: could not read", self.themeFile, e)
+
+        return icons
+
+    def names(self, sources):
+        """Sorted icon names found in any of the given sources."""
+        if sources not in self.filtered:
+            self.filtered[sources] = sorted( name for name, entry in self.load().items() if entry[0] & sources )
+        return self.filtered[sources]
+
+    def search(self, query, sources):
+        """Icon names of the given sources matching query, best first."""
+        if not query.strip():
+            return self.names(sources)
+        icons = self.load()
+        if self.index is None:
+            self.index = SearchIndex( (name, [(name, 1.0)]) for name in sorted(icons) )
+        return [ name for name in self.index.search(query) if icons[name][0] & sources ]
+
+    def paths(self, name):
+        entry = self.load().get(name)
+        return entry[1] if entry is not None else []
+
+
+class PixmapCache:
+    """LRU cache of rendered icons keyed by (name, size, device pixel ratio),
+    evicting the least recently used ones above maxBytes."""
+
+    def __init__(self, maxBytes=16*1024*1024):
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key):
+        pixmap = self.entries.get(key)
+        if pixmap is not None:
+            self.entries.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self.entries:
+            self.bytes -= self.cost(self.entries.pop(key))
+        self.entries[key] = pixmap
+        self.bytes += self.cost(pixmap)
+        self.evict()
+
+    def evict(self):
+        while self.bytes > self.maxBytes and len(self.entries) > 1:
+            (k, old) = self.entries.popitem(last=False)
+            self.bytes -= self.cost(old)
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+class ActionEntry:
+    __slots__ = ('name', 'toolTip', 'shortcut', 'checkable', 'action')
+
+    def __init__(self, action):
+        self.name = action.objectName()
+        self.toolTip = action.toolTip()
+        self.shortcut = action.shortcut().toString()
+        self.checkable = action.isCheckable()
+        self.action = action
+
+
+class ActionCatalog(QObject):
+    """Every action Krita registers, shared by the whole plugin.
+
+    It is built on first use and refreshed when a window is created, which
+    is when Krita and the plugins add their actions; a refresh only creates
+    entries for new actions and drops deleted ones. Lookups of names that
+    are not in the catalog yet fall back to the source once and add them.
+    """
+    changed = pyqtSignal()
+
+    _instance = None
+
+    @classmethod
+    def instance(cls, source=None):
+        if cls._instance is None:
+            cls._instance = ActionCatalog(source)
+        return cls._instance
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.entries = None
+        self.order = []
+        self.index = None
+        self.stats = { 'builds':0, 'refreshes':0, 'added':0, 'removed':0, 'buildTime':0.0, 'refreshTime':0.0 }
+
+    def load(self):
+        if self.entries is None:
+            start = time.perf_counter()
+            self.entries = {}
+            self.order = []
+            for action in self.source.actions():
+                self.add(action)
+            self.stats['builds'] += 1
+            self.stats['buildTime'] = time.perf_counter() - start
+        return self.entries
+
+    def add(self, action):
+        self.index = None
+        entry = ActionEntry(action)
+        if entry.name in self.entries:
+            self.entries[entry.name] = entry
+            return entry
+        self.entries[entry.name] = entry
+        self.order.append(entry.name)
+        return entry
+
+    def refresh(self):
+        if self.entries is None:
+            self.load()
+            self.changed.emit()
+            return
+        
+        start = time.perf_counter()
+        before = len(self.order)
+        seen = set()
+        for action in self.source.actions():
+            name = action.objectName()
+            seen.add(name)
+            entry = self.entries.get(name)
+            # the action may now be another window's, e.g. the one of the
+            # entry was closed
+            if entry is None or entry.action is not action or sip.isdeleted(entry.action):
+                self.add(action)
+        added = len(self.order) - before
+        
+        removed = [ name for name in self.order if name not in seen ]
+        for name in removed:
+            del self.entries[name]
+        if removed:
+            self.index = None
+            self.order = [ name for name in self.order if name in self.entries ]
+        
+        self.stats['refreshes'] += 1
+        self.stats['added'] += added
+        self.stats['removed'] += len(removed)
+        self.stats['refreshTime'] = time.perf_counter() - start
+        if added or removed:
+            self.changed.emit()
+
+    def __len__(self):
+        return len(self.load())
+
+    def names(self):
+        self.load()
+        return self.order
+
+    def entry(self, name):
+        entry = self.load().get(name)
+        if entry is not None and sip.isdeleted(entry.action):
+            entry = None
+        if entry is None:
+            action = self.source.action(name)
+            if action is None:
+                return None
+            entry = self.add(action)
+            self.changed.emit()
+        return entry
+
+    def action(self, name):
+        entry = self.entry(name)
+        return entry.action if entry is not None else None
+
+    def search(self, query):
+        """Action names matching query in their name, tooltip or shortcut,
+        best first."""
+        if not query.strip():
+            return self.names()
+        return self.searchIndex().search(query)
+
+    def searchIndex(self):
+        if self.index is None:
+            entries = self.load()
+            self.index = SearchIndex( (name, [(name, 1.0), (entries[name].toolTip, 0.9), (entries[name].shortcut, 0.7)]) for name in self.order )
+        return self.index
+
+    def missing(self, names):
+        """Names of the given actions Krita does not know."""
+        return [ name for name in names if self.entry(name) is None ]
+
+
+class WindowActions:
+    """The QActions of each main window by object name.
+
+    Krita gives every window its own action collection, so buttons and
+    popups trigger the actions of the window they are in. Windows are
+    scanned like in the DockerIndex; names a window doesn't have are
+    resolved through the shared ActionCatalog.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.windows = {}
+        self.missingNames = {}
+        self.stats = { 'lookups':0, 'scans':0 }
+
+    def scan(self, qwin):
+        self.windows[qwin] = { action.objectName():action for action in qwin.findChildren(QAction) if action.objectName() }
+        self.missingNames.setdefault(qwin, set())
+        self.stats['scans'] += 1
+
+    def action(self, qwin, name):
+        self.stats['lookups'] += 1
+        if qwin is None:
+            return self.catalog.action(name)
+        fresh = qwin not in self.windows
+        if fresh:
+            self.scan(qwin)
+        action = self.windows[qwin].get(name)
+        if action is not None and sip.isdeleted(action):
+            action = None
+        if action is None and not fresh and name not in self.missingNames[qwin]:
+            self.scan(qwin)
+            action = self.windows[qwin].get(name)
+        if action is None:
+            self.missingNames[qwin].add(name)
+            return self.catalog.action(name)
+        return action
+
+    def invalidate(self, qwin=None):
+        for w in ([qwin] if qwin is not None else list(self.windows)):
+            self.windows.pop(w, None)
+            self.missingNames.pop(w, None)
+
+
+class IconCache(QObject):
+    """Icons resolved by Krita icon name or action name, shared by the
+    toolbar buttons and the config lists.
+
+    Entries are kept in LRU order up to maxEntries; pixmap() entries are
+    also keyed by size and device pixel ratio. The cache is emptied when
+    the application palette changes, which is how a Krita theme switch
+    shows up, and invalidated() lets the holders of icons refresh them.
+    """
+    invalidated = pyqtSignal()
+
+    _instance = None
+
+    @classmethod
+    def instance(cls, provider=None):
+        if cls._instance is None:
+            cls._instance = IconCache(provider)
+        return cls._instance
+
+    def __init__(self, provider, maxEntries=1024, parent=None):
+        super().__init__(parent)
+        self.provider = provider
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.stats = { 'hits':0, 'misses':0, 'evictions':0, 'invalidations':0 }
+        app = QGuiApplication.instance()
+        if app is not None:
+            app.paletteChanged.connect(self.invalidate)
+
+    def lookup(self, key, resolve):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+        self.stats['misses'] += 1
+        value = self.entries[key] = resolve()
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return value
+
+    def icon(self, name):
+        return self.lookup( ('icon', name), lambda: self.provider(name) )
+
+    def actionIcon(self, name, action):
+        return self.lookup( ('action', name), action.icon )
+
+    def pixmap(self, name, size, ratio=1.0):
+        def render():
+            pixmap = self.icon(name).pixmap(size * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            return pixmap
+        return self.lookup( ('pixmap', name, size.width(), size.height(), ratio), render )
+
+    def invalidate(self, *args):
+        self.entries.clear()
+        self.stats['invalidations'] += 1
+        self.invalidated.emit()
+
+
+class DockerIndex:
+    """The QDockWidgets of each main window by object name.
+
+    A window is scanned once, on its first lookup. A name that is not
+    found rescans it once more, for dockers created later, after which
+    the name is remembered as missing until invalidate().
+    """
+
+    def __init__(self):
+        self.windows = {}
+        self.missingNames = {}
+        self.stats = { 'lookups':0, 'scans':0 }
+
+    def scan(self, qwin):
+        self.windows[qwin] = { dock.objectName():dock for dock in qwin.findChildren(QDockWidget) if dock.objectName() }
+        self.missingNames[qwin] = set()
+        self.stats['scans'] += 1
+
+    def docks(self, qwin):
+        if qwin not in self.windows:
+            self.scan(qwin)
+        return self.windows[qwin]
+
+    def dock(self, qwin, name):
+        self.stats['lookups'] += 1
+        fresh = qwin not in self.windows
+        dock = self.docks(qwin).get(name)
+        if dock is not None and sip.isdeleted(dock):
+            dock = None
+        if dock is None and not fresh and name not in self.missingNames[qwin]:
+            self.scan(qwin)
+            dock = self.windows[qwin].get(name)
+        if dock is None:
+            self.missingNames[qwin].add(name)
+        return dock
+
+    def title(self, qwin, name):
+        dock = self.dock(qwin, name) if qwin is not None else None
+        return dock.windowTitle() if dock is not None else name
+
+    def invalidate(self, qwin=None):
+        for w in ([qwin] if qwin is not None else list(self.windows)):
+            self.windows.pop(w, None)
+            self.missingNames.pop(w, None)
@@ -0,0 +1,257 @@
+import os
+import time
+import functools
+import xml.etree.ElementTree as ET
+from PyQt5 import uic
+from PyQt5.QtCore import Qt, QObject, QItemSelectionModel
+from PyQt5.QtWidgets import (QDialog, QDialogButtonBox, QVBoxLayout, QWidget, QLabel, QLineEdit, QSpinBox,
+                             QComboBox, QAbstractButton, QStackedWidget, QTabWidget, QAbstractItemView)
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+
+FORMS_PATH = os.path.dirname(os.path.realpath(__file__))
+
+# .ui file -> widget class, the XML is compiled once per process
+FORM_CLASSES = {}
+# .ui file -> FormSchema
+FORM_SCHEMAS = {}
+
+
+def formClass(name):
+    if name not in FORM_CLASSES:
+        (form, base) = uic.loadUiType(os.path.join(FORMS_PATH, name + '.ui'))
+        FORM_CLASSES[name] = type(name + 'Form', (base, form), {})
+    return FORM_CLASSES[name]
+
+
+def lineEditValue(w):
+    return w.text()
+
+def setLineEditValue(w, v):
+    w.setText(str(v))
+
+def spinBoxValue(w):
+    return w.value()
+
+def setSpinBoxValue(w, v):
+    w.setValue(int(v))
+
+def comboBoxValue(w):
+    return w.currentData() if w.currentData() else w.currentText()
+
+def setComboBoxValue(w, v):
+    i = w.findData(v)
+    if i < 0: i = w.findText(v)
+    if i >= 0: w.setCurrentIndex(i)
+
+# widget class -> (getter, setter, change signal)
+FIELD_KINDS = {
+    'QLineEdit': (lineEditValue, setLineEditValue, 'textChanged'),
+    'QSpinBox': (spinBoxValue, setSpinBoxValue, 'valueChanged'),
+    'QComboBox': (comboBoxValue, setComboBoxValue, 'currentIndexChanged')
+    }
+
+
+class FormSchema:
+    """The settings keys of a form: every input widget declared in the .ui
+    file whose objectName has no '_', with the widgets it is nested in."""
+
+    def __init__(self, path):
+        self.fields = {}
+        self.scopes = {}
+        self.collect(ET.parse(path).getroot(), ())
+
+    def collect(self, element, parents):
+        for child in element:
+            if child.tag == 'widget':
+                (cls, name) = (child.get('class'), child.get('name', ''))
+                if cls in FIELD_KINDS and '_' not in name:
+                    self.fields[name] = (cls, parents)
+                self.collect(child, parents + (name,))
+            else:
+                self.collect(child, parents)
+
+    def scope(self, root=None):
+        """Keys of the fields inside the widget named root, all if None."""
+        if root not in self.scopes:
+            self.scopes[root] = tuple( k for k, (cls, parents) in self.fields.items() if root is None or root in parents )
+        return self.scopes[root]
+
+
+def formSchema(name):
+    if name not in FORM_SCHEMAS:
+        FORM_SCHEMAS[name] = FormSchema(os.path.join(FORMS_PATH, name + '.ui'))
+    return FORM_SCHEMAS[name]
+
+
+class FormBinding:
+    """Binds the fields of a FormSchema to the widgets of one form.
+
+    Edits mark their key dirty through the widgets' change signals, so
+    changes() only compares the dirty keys and the ones the settings do
+    not have yet, without looking at the rest of the form.
+    """
+
+    def __init__(self, form, schema):
+        self.schema = schema
+        self.widgets = {}
+        self.dirty = set()
+        for key, (cls, parents) in schema.fields.items():
+            w = getattr(form, key, None)
+            if w is None: continue
+            (get, put, signal) = FIELD_KINDS[cls]
+            self.widgets[key] = (w, get, put)
+            getattr(w, signal).connect( functools.partial(self.mark, key) )
+
+    def mark(self, key, *args):
+        self.dirty.add(key)
+
+    def load(self, items, scope=None):
+        keys = self.schema.scope(scope)
+        for (k, v) in items.items():
+            if k in self.widgets and k in keys:
+                (w, get, put) = self.widgets[k]
+                try:
+                    put(w, v)
+                except (TypeError, ValueError):
+                    print ("ToolBarUI: ignoring setting", k, repr(v))
+        self.dirty.difference_update(keys)
+
+    def changes(self, items, scope=None):
+        """(key, value) pairs of the fields that differ from items."""
+        changed = []
+        for k in self.schema.scope(scope):
+            if k in self.widgets and (k in self.dirty or k not in items):
+                (w, get, put) = self.widgets[k]
+                value = get(w)
+                if k not in items or items[k] != value:
+                    changed.append( (k, value) )
+        self.dirty.difference_update(self.schema.scope(scope))
+        return changed
+
+    def reset(self):
+        self.dirty.clear()
+
+
+class ToolBarUIDialog(QDialog):
+    """A pooled dialog around one of the plugin forms.
+
+    Connections made for a single use go through connect() so release()
+    can drop them, and the form widgets are put back to the values they
+    had when the dialog was built.
+    """
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.connections = []
+
+        self.centralWidget = formClass(name)()
+        self.centralWidget.setupUi(self.centralWidget)
+        self.btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.btns.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.centralWidget)
+        layout.addWidget(self.btns)
+        self.setLayout(layout)
+
+        self.binding = FormBinding(self.centralWidget, formSchema(name))
+        self.defaults = None
+
+    def connect(self, signal, slot):
+        self.connections.append( signal.connect(slot) )
+
+    def captureDefaults(self):
+        self.defaults = []
+        for w in self.centralWidget.findChildren(QWidget):
+            if isinstance(w, (QLineEdit, QLabel)):
+                self.defaults.append( (w.setText, w, w.text()) )
+            elif isinstance(w, QSpinBox):
+                self.defaults.append( (w.setValue, w, w.value()) )
+            elif isinstance(w, (QComboBox, QStackedWidget, QTabWidget)):
+                self.defaults.append( (w.setCurrentIndex, w, w.currentIndex()) )
+            elif isinstance(w, QAbstractButton) and w.isCheckable():
+                self.defaults.append( (w.setChecked, w, w.isChecked()) )
+            elif isinstance(w, QAbstractItemView):
+                self.defaults.append( (functools.partial(self.clearView, w), w, None) )
+
+    def clearView(self, view, model):
+        # models made for a single use are parented to the dialog and go
+        # with it; every setModel() leaves a selection model on the view
+        # behind, only the current one is kept
+        used = view.model()
+        view.setModel(model)
+        if used is not None and used.parent() is self:
+            used.deleteLater()
+        current = view.selectionModel()
+        for selection in view.findChildren(QItemSelectionModel, options=Qt.FindDirectChildrenOnly):
+            if selection is not current:
+                selection.deleteLater()
+
+    def reset(self):
+        for connection in self.connections:
+            QObject.disconnect(connection)
+        self.connections = []
+
+        for (setter, w, value) in self.defaults:
+            blocked = w.blockSignals(True)
+            setter(value)
+            w.blockSignals(blocked)
+        self.binding.reset()
+
+
+class DialogPool:
+    """Built dialogs by form name, handed out by acquire() and taken back,
+    reset, by release(). A dialog opened while another of the same form is
+    in use, e.g. nested pickers, gets its own instance.
+
+    Pooled dialogs have no parent widget, closing the window one was opened
+    over must not delete it; that window is only made its transient parent.
+    """
+
+    def __init__(self, setup=None):
+        self.setup = setup
+        self.free = {}
+        self.stats = {}
+
+    def acquire(self, name, parent=None):
+        start = time.perf_counter()
+        free = self.free[name] = [ d for d in self.free.get(name, []) if not sip.isdeleted(d) ]
+        if free:
+            dlg = free.pop()
+            kind = 'warm'
+        else:
+            dlg = ToolBarUIDialog(name)
+            if self.setup is not None:
+                self.setup(dlg)
+            dlg.captureDefaults()
+            kind = 'cold'
+        self.place(dlg, parent)
+
+        stats = self.stats.setdefault(name, { 'cold':0, 'warm':0, 'coldTime':0.0, 'warmTime':0.0 })
+        stats[kind] += 1
+        stats[kind + 'Time'] += time.perf_counter() - start
+        return dlg
+
+    def place(self, dlg, parent):
+        if parent is None or sip.isdeleted(parent):
+            return
+        window = parent.window()
+        dlg.winId()
+        if window.windowHandle() is not None:
+            dlg.windowHandle().setTransientParent(window.windowHandle())
+        dlg.move(window.frameGeometry().center() - dlg.rect().center())
+
+    def release(self, dlg):
+        dlg.reset()
+        self.free.setdefault(dlg.name, []).append(dlg)
+
+    def clear(self):
+        for dialogs in self.free.values():
+            for dlg in dialogs:
+                dlg.deleteLater()
+        self.free = {}
@@ -0,0 +1,92 @@
+import time
+from PyQt5.QtCore import Qt, QPoint, QPropertyAnimation, QEasingCurve, pyqtProperty, pyqtSignal
+from PyQt5.QtGui import QPainter
+from PyQt5.QtWidgets import QWidget
+
+
+class DrawerSlide(QWidget):
+    """Slides a drawer toolbar in or out of its window edge.
+
+    What moves is a snapshot of the toolbar painted at an animated offset
+    inside the toolbar's own rectangle, so a frame is one pixmap draw
+    whatever the toolbar holds, and the toolbar itself is neither resized
+    nor laid out. finished(opening) is emitted at the end, when the real
+    toolbar takes over.
+    """
+    finished = pyqtSignal(bool)
+    DURATION = 160
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hide()
+        self.pixmap = None
+        self.opening = False
+        self.position = QPoint()
+        self.lastFrame = None
+        self.animation = QPropertyAnimation(self, b'offset', self)
+        self.animation.setEasingCurve(QEasingCurve.OutCubic)
+        self.animation.finished.connect(self.done)
+        self.stats = { 'slides':0, 'frames':0, 'paintTime':0.0, 'maxPaint':0.0, 'maxInterval':0.0 }
+
+    def getOffset(self):
+        return self.position
+
+    def setOffset(self, offset):
+        self.position = offset
+        self.update()
+
+    offset = pyqtProperty(QPoint, fget=getOffset, fset=setOffset)
+
+    @staticmethod
+    def hiddenOffset(edge, size):
+        if edge == 'Top':
+            return QPoint(0, -size.height())
+        if edge == 'Left':
+            return QPoint(-size.width(), 0)
+        if edge == 'Right':
+            return QPoint(size.width(), 0)
+        return QPoint(0, size.height())
+
+    def isRunning(self):
+        return self.animation.state() == QPropertyAnimation.Running
+
+    def slide(self, pixmap, geometry, edge, opening):
+        hidden = self.hiddenOffset(edge, geometry.size())
+        # a slide turned around midway continues from where it is
+        start = self.position if self.isRunning() else (hidden if opening else QPoint())
+        self.animation.stop()
+        self.pixmap = pixmap
+        self.opening = opening
+        self.setGeometry(geometry)
+        self.animation.setDuration(self.DURATION)
+        self.animation.setStartValue(start)
+        self.animation.setEndValue(QPoint() if opening else hidden)
+        self.position = start
+        self.lastFrame = None
+        self.stats['slides'] += 1
+        self.show()
+        self.raise_()
+        self.animation.start()
+
+    def done(self):
+        self.hide()
+        self.pixmap = None
+        self.finished.emit(self.opening)
+
+    def paintEvent(self, event):
+        if self.pixmap is None:
+            return
+        start = time.perf_counter()
+        painter = QPainter(self)
+        painter.drawPixmap(self.position, self.pixmap)
+        painter.end()
+
+        end = time.perf_counter()
+        paint = end - start
+        self.stats['frames'] += 1
+        self.stats['paintTime'] += paint
+        self.stats['maxPaint'] = max(self.stats['maxPaint'], paint)
+        if self.lastFrame is not None:
+            self.stats['maxInterval'] = max(self.stats['maxInterval'], end - self.lastFrame)
+        self.lastFrame = end
@@ -0,0 +1,156 @@
+from collections.abc import Mapping
+
+
+MISSING = object()
+
+
+class JournalError(RuntimeError):
+    pass
+
+
+class Journal:
+    """Records mutations of the settings tree so they can be undone.
+
+    begin() opens a scope and commit()/rollback() close it; scopes nest.
+    The outermost scope is the configuration session: every change made
+    directly in it, and every nested scope committed into it, becomes one
+    undo step that undo()/redo() can replay. Only the mutated containers
+    are touched, so the cost follows the size of the edit, not the layout.
+
+    Mutations can carry a tag (the toolbar uuid, or 'config') and tags()
+    tells which tags have live changes in the session.
+    """
+
+    def __init__(self):
+        self.scopes = []
+        self.undoStack = []
+        self.redoStack = []
+
+    def depth(self):
+        return len(self.scopes)
+
+    def begin(self):
+        self.scopes.append([])
+        return len(self.scopes)
+
+    def commit(self):
+        if not self.scopes:
+            raise JournalError('commit without begin')
+        ops = self.scopes.pop()
+        if len(self.scopes) == 1:
+            self.step(ops)
+        elif self.scopes:
+            self.scopes[-1].extend(ops)
+        else:
+            ops = [ op for step in self.undoStack for op in step ] + ops
+            self.undoStack = []
+            self.redoStack = []
+        return ops
+
+    def rollback(self):
+        if not self.scopes:
+            raise JournalError('rollback without begin')
+        ops = self.scopes.pop()
+        self.revert(ops)
+        if not self.scopes:
+            while self.undoStack:
+                self.revert(self.undoStack.pop())
+            self.redoStack = []
+
+    def step(self, ops):
+        if ops:
+            self.undoStack.append(ops)
+            self.redoStack = []
+
+    def canUndo(self):
+        return len(self.scopes) == 1 and bool(self.undoStack)
+
+    def canRedo(self):
+        return len(self.scopes) == 1 and bool(self.redoStack)
+
+    def undo(self):
+        if len(self.scopes) != 1:
+            raise JournalError('undo is only available between edits')
+        if not self.undoStack: return False
+        ops = self.undoStack.pop()
+        self.revert(ops)
+        self.redoStack.append(ops)
+        return True
+
+    def redo(self):
+        if len(self.scopes) != 1:
+            raise JournalError('redo is only available between edits')
+        if not self.redoStack: return False
+        ops = self.redoStack.pop()
+        for op in ops:
+            self.apply(op, False)
+        self.undoStack.append(ops)
+        return True
+
+    def tags(self):
+        tags = set()
+        for ops in self.undoStack + self.scopes:
+            for op in ops:
+                tags.add(op[4])
+        tags.discard(None)
+        return tags
+
+    def revert(self, ops):
+        for op in reversed(ops):
+            self.apply(op, True)
+
+    def apply(self, op, inverse):
+        (kind, container, key, (old, new), tag) = op
+
+        if kind == 'set':
+            value = old if inverse else new
+            if value is MISSING:
+                del container[key]
+            else:
+                container[key] = value
+        elif kind == 'insert':
+            if inverse:
+                container.pop(key)
+            else:
+                container.insert(key, new)
+        elif kind == 'pop':
+            if inverse:
+                container.insert(key, old)
+            else:
+                container.pop(key)
+
+    def record(self, op):
+        if not self.scopes:
+            raise JournalError('mutation outside of a transaction')
+        if len(self.scopes) == 1:
+            self.step([op])
+        else:
+            self.scopes[-1].append(op)
+
+    def set(self, container, key, value, tag=None):
+        if isinstance(container, Mapping):
+            old = container.get(key, MISSING)
+        else:
+            old = container[key]
+        container[key] = value
+        self.record(('set', container, key, (old, value), tag))
+
+    def delete(self, container, key, tag=None):
+        old = container[key]
+        del container[key]
+        self.record(('set', container, key, (old, MISSING), tag))
+
+    def insert(self, container, index, value, tag=None):
+        if index < 0: index += len(container) + 1
+        index = max(0, min(index, len(container)))
+        container.insert(index, value)
+        self.record(('insert', container, index, (MISSING, value), tag))
+
+    def append(self, container, value, tag=None):
+        self.insert(container, len(container), value, tag)
+
+    def pop(self, container, index=-1, tag=None):
+        if index < 0: index += len(container)
+        value = container.pop(index)
+        self.record(('pop', container, index, (value, MISSING), tag))
+        return value
@@ -0,0 +1,348 @@
+import sys
+from collections.abc import Mapping
+
+
+PANELS = ('top', 'bottom')
+
+
+class LayoutError(ValueError):
+    def __init__(self, path, message):
+        super().__init__(path + ': ' + message)
+        self.path = path
+
+
+def _text(value, path, default=None):
+    if value is None:
+        if default is None:
+            raise LayoutError(path, 'missing')
+        value = default
+    if not isinstance(value, str):
+        raise LayoutError(path, 'expected a string, got ' + type(value).__name__)
+    return sys.intern(value)
+
+def _int(value, path, default=0):
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise LayoutError(path, 'expected a number, got ' + repr(value))
+
+def _dict(value, path):
+    if not isinstance(value, dict):
+        raise LayoutError(path, 'expected an object, got ' + type(value).__name__)
+    return value
+
+def _list(value, path):
+    if not isinstance(value, list):
+        raise LayoutError(path, 'expected a list, got ' + type(value).__name__)
+    return value
+
+def _config(value, path):
+    return { sys.intern(k):(sys.intern(v) if isinstance(v, str) else v) for k, v in _dict(value, path).items() }
+
+
+class Compiled:
+    """Immutable, slot based node of a compiled layout.
+
+    KEYS are the json keys the node understands; whatever else the source
+    dict held is kept in extra and written back by toJson, as is the
+    source key order, so compile/toJson round-trips losslessly.
+    """
+    __slots__ = ('keys', 'extra')
+    KEYS = ()
+
+    def __init__(self, **values):
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, k, v):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+    def __delattr__(self, k):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all( getattr(self, k) == getattr(other, k) for k in self.slots() )
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    @classmethod
+    def slots(cls):
+        for c in cls.__mro__:
+            yield from c.__dict__.get('__slots__', ())
+
+    @classmethod
+    def split(cls, data, path):
+        _dict(data, path)
+        keys = tuple( sys.intern(k) for k in data.keys() )
+        extra = { k:v for k, v in data.items() if k not in cls.KEYS } or None
+        return keys, extra
+
+    def emit(self, values):
+        data = {}
+        for k in self.keys:
+            if k in values:
+                data[k] = values[k]
+            elif self.extra is not None and k in self.extra:
+                data[k] = self.extra[k]
+        return data
+
+    def footprint(self, seen):
+        if id(self) in seen: return 0
+        seen.add(id(self))
+        size = sys.getsizeof(self)
+        for k in self.slots():
+            size += _footprint(getattr(self, k), seen)
+        return size
+
+
+def _footprint(value, seen):
+    if isinstance(value, (Compiled, CompiledToolbars)):
+        return value.footprint(seen)
+    if id(value) in seen or value is None or isinstance(value, (bool, int, float)):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _footprint(k, seen) + _footprint(v, seen)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            size += _footprint(v, seen)
+    return size
+
+
+class ActionRef(Compiled):
+    __slots__ = ('name', 'icon')
+    KEYS = ('name', 'icon')
+
+    @classmethod
+    def compile(cls, data, path):
+        keys, extra = cls.split(data, path)
+        return cls(
+            keys = keys,
+            extra = extra,
+            name = _text(data.get('name'), path + '.name'),
+            icon = _text(data.get('icon'), path + '.icon', '')
+            )
+
+    def toJson(self):
+        return self.emit({ 'name':self.name, 'icon':self.icon })
+
+
+class Reaction(Compiled):
+    __slots__ = ('uuid', 'alias', 'type', 'openBy', 'closeBy', 'openTimeout', 'closeTimeout', 'position', 'dockType', 'actions', 'dockers', 'config')
+    KEYS = ('uuid', 'alias', 'actions', 'dockers', 'config')
+
+    @classmethod
+    def compile(cls, data, path):
+        keys, extra = cls.split(data, path)
+        config = _config(data.get('config', {}), path + '.config')
+        return cls(
+            keys = keys,
+            extra = extra,
+            uuid = _text(data.get('uuid'), path + '.uuid'),
+            alias = _text(data.get('alias'), path + '.alias', ''),
+            type = _text(config.get('reactionTypeCmb'), path + '.config.reactionTypeCmb', 'Action Collection'),
+            openBy = _text(config.get('reactionOpenByCmb'), path + '.config.reactionOpenByCmb', 'default'),
+            closeBy = _text(config.get('reactionCloseByCmb'), path + '.config.reactionCloseByCmb', 'default'),
+            openTimeout = _int(config.get('intReactionOpenTimeout'), path + '.config.intReactionOpenTimeout'),
+            closeTimeout = _int(config.get('intReactionCloseTimeout'), path + '.config.intReactionCloseTimeout'),
+            position = _text(config.get('positionSetCmb'), path + '.config.positionSetCmb', 'Top/Left Bar'),
+            dockType = _text(config.get('dockerDockType'), path + '.config.dockerDockType', 'Default'),
+            actions = tuple( ActionRef.compile(a, path + '.actions[' + str(i) + ']') for i, a in enumerate(_list(data.get('actions', []), path + '.actions')) ),
+            dockers = tuple( _list(data.get('dockers', []), path + '.dockers') ),
+            config = config
+            )
+
+    def toJson(self):
+        return self.emit({
+            'uuid':self.uuid,
+            'alias':self.alias,
+            'actions':[ a.toJson() for a in self.actions ],
+            'dockers':list(self.dockers),
+            'config':dict(self.config)
+            })
+
+
+class Item(Compiled):
+    __slots__ = ('uuid', 'alias', 'reactions')
+    KEYS = ('uuid', 'alias', 'reactions')
+
+    @classmethod
+    def compile(cls, data, path):
+        keys, extra = cls.split(data, path)
+        return cls(
+            keys = keys,
+            extra = extra,
+            uuid = _text(data.get('uuid'), path + '.uuid'),
+            alias = _text(data.get('alias'), path + '.alias', ''),
+            reactions = tuple( Reaction.compile(r, path + '.reactions[' + str(i) + ']') for i, r in enumerate(_list(data.get('reactions', []), path + '.reactions')) )
+            )
+
+    def toJson(self):
+        return self.emit({
+            'uuid':self.uuid,
+            'alias':self.alias,
+            'reactions':[ r.toJson() for r in self.reactions ]
+            })
+
+
+class Toolbar(Compiled):
+    __slots__ = ('uuid', 'name', 'type', 'position', 'buttonSize', 'openBy', 'closeBy', 'openTimeout', 'closeTimeout', 'config', 'top', 'bottom', 'panelExtra')
+    KEYS = ('config',) + PANELS
+
+    @classmethod
+    def compile(cls, uuid, data, path):
+        keys, extra = cls.split(data, path)
+        config = _config(data.get('config', {}), path + '.config')
+        panels = {}
+        panelExtra = {}
+        for panel in PANELS:
+            pdata = _dict(data.get(panel, { 'items':[] }), path + '.' + panel)
+            panels[panel] = tuple( Item.compile(iv, path + '.' + panel + '.items[' + str(i) + ']') for i, iv in enumerate(_list(pdata.get('items', []), path + '.' + panel + '.items')) )
+            if len(pdata) > 1 or 'items' not in pdata:
+                panelExtra[panel] = { k:v for k, v in pdata.items() if k != 'items' }
+                panelExtra[panel]['#keys'] = tuple(pdata.keys())
+
+        uuid = _text(uuid, path)
+        return cls(
+            keys = keys,
+            extra = extra,
+            uuid = uuid,
+            name = _text(config.get('toolbarName'), path + '.config.toolbarName', 'ToolBar ' + uuid),
+            type = _text(config.get('toolbarTypeCmb'), path + '.config.toolbarTypeCmb', 'default'),
+            position = _text(config.get('positionCmb'), path + '.config.positionCmb', 'Bottom'),
+            buttonSize = _int(config.get('intButtonSize'), path + '.config.intButtonSize'),
+            openBy = _text(config.get('reactionOpenByCmb'), path + '.config.reactionOpenByCmb', 'default'),
+            closeBy = _text(config.get('reactionCloseByCmb'), path + '.config.reactionCloseByCmb', 'default'),
+            openTimeout = _int(config.get('intReactionOpenTimeout'), path + '.config.intReactionOpenTimeout'),
+            closeTimeout = _int(config.get('intReactionCloseTimeout'), path + '.config.intReactionCloseTimeout'),
+            config = config,
+            top = panels['top'],
+            bottom = panels['bottom'],
+            panelExtra = panelExtra or None
+            )
+
+    def panel(self, panel):
+        return self.top if panel == 'top' else self.bottom
+
+    def items(self):
+        for panel in PANELS:
+            for item in self.panel(panel):
+                yield panel, item
+
+    def toJson(self):
+        values = { 'config':dict(self.config) }
+        for panel in PANELS:
+            items = [ iv.toJson() for iv in self.panel(panel) ]
+            if self.panelExtra is not None and panel in self.panelExtra:
+                extra = self.panelExtra[panel]
+                values[panel] = { k:(items if k == 'items' else extra[k]) for k in extra['#keys'] }
+            else:
+                values[panel] = { 'items':items }
+        return self.emit(values)
+
+
+class CompiledToolbars(Mapping):
+    """uuid -> Toolbar, where toolbars that were never loaded are only
+    compiled (and so validated) the first time they are looked up."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __getitem__(self, uuid):
+        entry = self.entries[uuid]
+        if not isinstance(entry, Toolbar):
+            entry = Toolbar.compile(uuid, entry(), 'settings.toolbars[' + uuid + ']')
+            self.entries[uuid] = entry
+        return entry
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, uuid):
+        return uuid in self.entries
+
+    def __eq__(self, other):
+        if not isinstance(other, CompiledToolbars):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    __hash__ = None
+
+    def entry(self, uuid):
+        return self.entries[uuid]
+
+    def isCompiled(self, uuid):
+        return isinstance(self.entries[uuid], Toolbar)
+
+    def footprint(self, seen):
+        seen.add(id(self))
+        return sys.getsizeof(self) + _footprint(self.entries, seen)
+
+
+class Layout(Compiled):
+    """Compiled, validated form of the plugin settings.
+
+    Built once per settings change and shared read-only by the runtime;
+    toJson gives back the settings dict it was compiled from. Passing the
+    previous layout and the changed toolbar uuids reuses everything else.
+    """
+    __slots__ = ('version', 'count', 'openBy', 'closeBy', 'openTimeout', 'closeTimeout', 'config', 'toolbars')
+    KEYS = ('version', 'count', 'config', 'toolbars')
+
+    @classmethod
+    def compile(cls, settings, previous=None, dirty=None):
+        keys, extra = cls.split(settings, 'settings')
+        config = _config(settings.get('config', {}), 'settings.config')
+        toolbars = settings.get('toolbars', {})
+        if not isinstance(toolbars, Mapping):
+            _dict(toolbars, 'settings.toolbars')
+        
+        entries = {}
+        for tuuid in toolbars.keys():
+            if previous is not None and dirty is not None and tuuid not in dirty and tuuid in previous.toolbars:
+                entries[tuuid] = previous.toolbars.entry(tuuid)
+                continue
+            loader = toolbars.loader(tuuid) if hasattr(toolbars, 'loader') else None
+            if loader is not None:
+                entries[sys.intern(tuuid)] = loader
+            else:
+                entries[sys.intern(tuuid)] = Toolbar.compile(tuuid, toolbars[tuuid], 'settings.toolbars[' + tuuid + ']')
+        
+        return cls(
+            keys = keys,
+            extra = extra,
+            version = settings.get('version', 0),
+            count = settings.get('count', 0),
+            openBy = _text(config.get('reactionOpenByCmb'), 'settings.config.reactionOpenByCmb', 'default'),
+            closeBy = _text(config.get('reactionCloseByCmb'), 'settings.config.reactionCloseByCmb', 'default'),
+            openTimeout = _int(config.get('intReactionOpenTimeout'), 'settings.config.intReactionOpenTimeout'),
+            closeTimeout = _int(config.get('intReactionCloseTimeout'), 'settings.config.intReactionCloseTimeout'),
+            config = config,
+            toolbars = CompiledToolbars(entries)
+            )
+
+    def toJson(self):
+        return self.emit({
+            'version':self.version,
+            'count':self.count,
+            'config':dict(self.config),
+            'toolbars':{ tuuid:t.toJson() for tuuid, t in self.toolbars.items() }
+            })
+
+    def memoryFootprint(self):
+        """Approximate size in bytes of the compiled layout; interned and
+        shared objects are only counted once."""
+        return self.footprint(set())
@@ -0,0 +1,243 @@
+import time
+from PyQt5.QtCore import Qt, QAbstractListModel, QAbstractTableModel, QModelIndex, QSize
+from PyQt5.QtGui import QPixmap, QColor
+from .ToolBarUICatalog import PixmapCache
+from .ToolBarUIRender import preferredPath, iconTheme
+
+
+class IconListModel(QAbstractListModel):
+    """Icon names for the IconPicker grid.
+
+    Icons are only resolved and rasterized when the view asks for the
+    decoration of a row, i.e. when it is painted, and the pixmaps are kept
+    in a size bounded PixmapCache. With a renderer, icons that have resource
+    paths are rasterized in the background and a placeholder is shown until
+    they arrive; the others are drawn on the GUI thread.
+    """
+
+    def __init__(self, iconProvider, cache=None, renderer=None, pathProvider=None, parent=None):
+        super().__init__(parent)
+        self.iconProvider = iconProvider
+        self.cache = cache if cache is not None else PixmapCache()
+        self.renderer = renderer
+        self.pathProvider = pathProvider
+        self.names = []
+        self.rows = {}
+        self.failed = set()
+        self.placeholder = None
+        self.iconSize = QSize(32, 32)
+        self.ratio = 1.0
+        self.theme = iconTheme()
+
+        if renderer is not None:
+            renderer.rendered.connect(self.iconsRendered)
+
+    def setNames(self, names):
+        if self.renderer is not None:
+            self.renderer.cancel()
+        self.beginResetModel()
+        self.names = list(names)
+        self.rows = { name:row for row, name in enumerate(self.names) }
+        self.endResetModel()
+
+    def setIconSize(self, size, ratio=1.0):
+        self.iconSize = size
+        self.ratio = ratio
+        self.theme = iconTheme()
+        self.placeholder = None
+        if self.renderer is not None:
+            self.renderer.cancel()
+            self.renderer.setSize(size, ratio)
+        if self.names:
+            self.dataChanged.emit(self.index(0), self.index(len(self.names)-1), [Qt.DecorationRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        name = self.names[index.row()]
+        if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+            return name
+        if role == Qt.DecorationRole:
+            return self.pixmap(name)
+        return None
+
+    def key(self, name):
+        return (name, self.iconSize.width(), self.ratio, self.theme)
+
+    def pixmap(self, name):
+        pixmap = self.cache.get(self.key(name))
+        if pixmap is not None:
+            return pixmap
+
+        if self.renderer is not None and name not in self.failed:
+            path = preferredPath(self.pathProvider(name), self.theme)
+            if path is not None:
+                self.renderer.request(name, path)
+                return self.placeholderPixmap()
+
+        pixmap = self.iconProvider(name).pixmap(self.iconSize * self.ratio)
+        pixmap.setDevicePixelRatio(self.ratio)
+        self.cache.put(self.key(name), pixmap)
+        return pixmap
+
+    def placeholderPixmap(self):
+        if self.placeholder is None:
+            self.placeholder = QPixmap(self.iconSize * self.ratio)
+            self.placeholder.fill(QColor(128, 128, 128, 40))
+            self.placeholder.setDevicePixelRatio(self.ratio)
+        return self.placeholder
+
+    def iconsRendered(self, icons):
+        for (name, pixmap) in icons:
+            if pixmap is None:
+                self.failed.add(name)
+            else:
+                self.cache.put(self.key(name), pixmap)
+            row = self.rows.get(name)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class ActionTableModel(QAbstractTableModel):
+    """The ActionPicker table over the shared ActionCatalog.
+
+    Rows are read from the catalog entries, icons are only fetched for rows
+    that get painted. One model is kept for the whole session and follows
+    the catalog when it changes. setFilter() shows the catalog's search
+    results in their ranked order.
+    """
+    HEADERS = ('Name', 'Description')
+
+    def __init__(self, catalog, iconCache, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.iconCache = iconCache
+        self.names = list(catalog.names())
+        self.query = ''
+        catalog.changed.connect(self.catalogChanged)
+
+    def catalogChanged(self):
+        self.setFilter(self.query)
+
+    def setFilter(self, query):
+        self.query = query
+        self.beginResetModel()
+        self.names = list(self.catalog.search(query))
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        entry = self.catalog.entries.get(self.names[index.row()])
+        if entry is None:
+            return None
+        if role == Qt.DisplayRole:
+            return entry.name if index.column() == 0 else entry.toolTip
+        if role == Qt.ToolTipRole:
+            return entry.shortcut or None
+        if role == Qt.DecorationRole and index.column() == 1:
+            return self.iconCache.actionIcon(entry.name, entry.action)
+        return None
+
+
+class SettingsListModel(QAbstractListModel):
+    """A config dialog list reading straight from the settings tree.
+
+    source() returns the current sequence of rows, label(row) its text and
+    key(row) what identifies a row across edits (the row object itself by
+    default). sync() compares the rows with what the view has and emits
+    only the inserts, removals, moves and label changes in between, so
+    selections and the scroll position survive edits, undo and redo.
+    """
+
+    def __init__(self, source, label, key=None, userData=None, decoration=None, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.label = label
+        self.key = key or id
+        self.userData = userData
+        self.decoration = decoration
+        # keys, the row objects (which also keeps id() keys from being
+        # reused) and labels as the view knows them
+        self.keys = []
+        self.rows = []
+        self.labels = []
+        self.stats = { 'syncs':0, 'inserted':0, 'removed':0, 'moved':0, 'changed':0, 'time':0.0 }
+        self.sync()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.keys):
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.labels[row]
+        if role == Qt.UserRole+1 and self.userData is not None:
+            return self.userData(self.rows[row])
+        if role == Qt.DecorationRole and self.decoration is not None:
+            return self.decoration(self.rows[row])
+        return None
+
+    def sync(self):
+        start = time.perf_counter()
+        rows = list(self.source())
+        keys = [ self.key(r) for r in rows ]
+        wanted = set(keys)
+
+        for i in range(len(self.keys) - 1, -1, -1):
+            if self.keys[i] not in wanted:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self.keys[i], self.rows[i], self.labels[i]
+                self.endRemoveRows()
+                self.stats['removed'] += 1
+
+        present = set(self.keys)
+        for i, k in enumerate(keys):
+            if i < len(self.keys) and self.keys[i] == k:
+                continue
+            if k in present:
+                # the rows before i are in place already, so j > i
+                j = self.keys.index(k, i + 1)
+                self.beginMoveRows(QModelIndex(), j, j, QModelIndex(), i)
+                self.keys.insert(i, self.keys.pop(j))
+                self.rows.insert(i, self.rows.pop(j))
+                self.labels.insert(i, self.labels.pop(j))
+                self.endMoveRows()
+                self.stats['moved'] += 1
+            else:
+                self.beginInsertRows(QModelIndex(), i, i)
+                self.keys.insert(i, k)
+                self.rows.insert(i, rows[i])
+                self.labels.insert(i, self.label(rows[i]))
+                self.endInsertRows()
+                present.add(k)
+                self.stats['inserted'] += 1
+
+        for i, r in enumerate(rows):
+            self.rows[i] = r
+            text = self.label(r)
+            if text != self.labels[i]:
+                self.labels[i] = text
+                index = self.index(i)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+                self.stats['changed'] += 1
+
+        self.stats['syncs'] += 1
+        self.stats['time'] += time.perf_counter() - start
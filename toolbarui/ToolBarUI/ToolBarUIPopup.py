@@ -0,0 +1,288 @@
+import math
+import time
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QPoint, QRect, QEvent
+from PyQt5.QtWidgets import QFrame, QGridLayout, QVBoxLayout, QToolButton, QListView, QAbstractItemView, QApplication, QTabWidget
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+
+class ActionListModel(QAbstractListModel):
+    """The actions of a large collection, for the popup's list view."""
+
+    def __init__(self, entries, iconCache, parent=None):
+        super().__init__(parent)
+        # (ActionRef, QAction)
+        self.entries = entries
+        self.iconCache = iconCache
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries):
+            return None
+        (ra, action) = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            return action.text().replace('&', '')
+        if role == Qt.ToolTipRole:
+            return action.toolTip()
+        if role == Qt.DecorationRole:
+            return self.iconCache.actionIcon(ra.name, action) if ra.icon == '' else self.iconCache.icon(ra.icon)
+        return None
+
+
+class ReactionPopup(QFrame):
+    """Popup frame of a reaction: placement next to its button, closing on
+    hover and open to paint latency."""
+    # time to get from the button to a popup that closes on hover
+    HOVER_GRACE = 0.3
+
+    def __init__(self, reaction, timers=None, parent=None):
+        super().__init__(parent, Qt.Popup)
+        self.reaction = reaction
+        self.timers = timers
+        self.closeDelay = None
+        self.setFrameShape(QFrame.StyledPanel)
+        self.opened = None
+        self.stats = { 'opens':0, 'latency':0.0, 'maxLatency':0.0 }
+
+    def openAt(self, anchor, orientation=Qt.Horizontal, closeDelay=None):
+        """Shows the popup next to the anchor widget, on the side away from
+        its toolbar and flipped when the screen has no room there. With a
+        closeDelay it closes when the pointer stays away that long."""
+        self.opened = time.perf_counter()
+        self.closeDelay = closeDelay
+        size = self.size()
+        rect = QRect(anchor.mapToGlobal(QPoint(0, 0)), anchor.size())
+        screen = QApplication.screenAt(rect.center())
+        area = screen.availableGeometry() if screen is not None else QRect(rect.topLeft(), size)
+
+        if orientation == Qt.Horizontal:
+            pos = QPoint(rect.left(), rect.bottom() + 1)
+            if pos.y() + size.height() > area.bottom():
+                pos.setY(rect.top() - size.height())
+        else:
+            pos = QPoint(rect.right() + 1, rect.top())
+            if pos.x() + size.width() > area.right():
+                pos.setX(rect.left() - size.width())
+        pos.setX(max(area.left(), min(pos.x(), area.right() - size.width())))
+        pos.setY(max(area.top(), min(pos.y(), area.bottom() - size.height())))
+
+        self.move(pos)
+        self.show()
+        if closeDelay is not None and self.timers is not None:
+            self.timers.schedule( ('close', self), max(closeDelay, self.HOVER_GRACE), self.close )
+
+    def enterEvent(self, event):
+        if self.timers is not None:
+            self.timers.cancel( ('close', self) )
+        super().enterEvent(event)
+
+    def leaveEvent(self, event):
+        if self.closeDelay is not None and self.timers is not None and self.isVisible():
+            self.timers.schedule( ('close', self), self.closeDelay, self.close )
+        super().leaveEvent(event)
+
+    def hideEvent(self, event):
+        if self.timers is not None:
+            self.timers.cancel( ('close', self) )
+        super().hideEvent(event)
+
+    def event(self, event):
+        result = super().event(event)
+        if event.type() == QEvent.Paint and self.opened is not None:
+            # open to first paint
+            latency = time.perf_counter() - self.opened
+            self.opened = None
+            self.stats['opens'] += 1
+            self.stats['latency'] += latency
+            self.stats['maxLatency'] = max(self.stats['maxLatency'], latency)
+        return result
+
+
+class ActionPopup(ReactionPopup):
+    """Popup with the actions of an Action Collection reaction.
+
+    Up to GRID_LIMIT actions are laid out as a grid of buttons, larger
+    collections go in a list view with uniform rows, which only creates
+    and paints what is visible. The layout is done when the popup is
+    built, opening it only moves and shows it.
+    """
+    GRID_LIMIT = 64
+    LIST_ROWS = 12
+
+    def __init__(self, reaction, entries, iconCache, buttonSize=32, timers=None, parent=None):
+        super().__init__(reaction, timers, parent)
+
+        if len(entries) <= self.GRID_LIMIT:
+            layout = QGridLayout()
+            columns = max(1, math.ceil(math.sqrt(len(entries))))
+            for i, (ra, action) in enumerate(entries):
+                button = QToolButton(self)
+                button.setDefaultAction(action)
+                button.setAutoRaise(True)
+                button.setIconSize(QSize(buttonSize, buttonSize))
+                if ra.icon != '':
+                    button.setIcon(iconCache.icon(ra.icon))
+                elif action.icon().isNull():
+                    button.setIcon(iconCache.actionIcon(ra.name, action))
+                button.clicked.connect(self.close)
+                layout.addWidget(button, i // columns, i % columns)
+            self.view = None
+        else:
+            layout = QVBoxLayout()
+            self.view = QListView(self)
+            self.view.setUniformItemSizes(True)
+            self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            self.view.setIconSize(QSize(buttonSize // 2, buttonSize // 2))
+            self.view.setModel(ActionListModel(entries, iconCache, self.view))
+            self.view.activated.connect(self.activated)
+            self.view.clicked.connect(self.activated)
+            rowHeight = max(self.view.sizeHintForRow(0), buttonSize // 2)
+            self.view.setFixedHeight(rowHeight * self.LIST_ROWS + 2 * self.view.frameWidth())
+            layout.addWidget(self.view)
+
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.setSpacing(1)
+        self.setLayout(layout)
+        self.ensurePolished()
+        self.adjustSize()
+
+    def activated(self, index):
+        (ra, action) = self.view.model().entries[index.row()]
+        self.close()
+        action.trigger()
+
+
+class DockerPopup(ReactionPopup):
+    """Popup lending the contents of existing dockers.
+
+    While it is open the widgets of the dockers are moved into it, and on
+    close they are given back to their dock widgets, so nothing is created
+    or rebuilt and the dockers keep their state. Several dockers are shown
+    as tabs.
+    """
+
+    def __init__(self, reaction, timers=None, parent=None):
+        super().__init__(reaction, timers, parent)
+        self.borrowed = []
+        self.tabs = None
+        layout = QVBoxLayout()
+        layout.setContentsMargins(2, 2, 2, 2)
+        self.setLayout(layout)
+
+    def borrow(self, docks):
+        self.giveBack()
+        if len(docks) > 1 and self.tabs is None:
+            self.tabs = QTabWidget(self)
+            self.layout().addWidget(self.tabs)
+        for dock in docks:
+            w = dock.widget()
+            if w is None:
+                continue
+            self.borrowed.append( (dock, w) )
+            if self.tabs is not None:
+                self.tabs.addTab(w, dock.windowTitle())
+            else:
+                self.layout().addWidget(w)
+            w.show()
+        self.adjustSize()
+        return bool(self.borrowed)
+
+    def giveBack(self):
+        for (dock, w) in self.borrowed:
+            if not sip.isdeleted(dock) and not sip.isdeleted(w):
+                dock.setWidget(w)
+        self.borrowed = []
+        if self.tabs is not None:
+            self.tabs.clear()
+
+    def hideEvent(self, event):
+        self.giveBack()
+        super().hideEvent(event)
+
+
+class PopupCache:
+    """Reaction popups by (main window, reaction uuid).
+
+    Each window has its own popups as the actions they trigger and the
+    dockers they lend are the window's own. prepare() has a popup built
+    at idle time, before it is first opened; popup() hands it out,
+    building it right away if it is still pending. A popup is rebuilt
+    when its reaction changed, and popups no button shows any more are
+    dropped by retain().
+    """
+
+    def __init__(self, idle, iconCache, timers=None):
+        self.idle = idle
+        self.iconCache = iconCache
+        self.timers = timers
+        self.popups = {}
+        self.stats = { 'built':0, 'prebuilt':0, 'hits':0 }
+
+    def __len__(self):
+        return len(self.popups)
+
+    def prepare(self, key, reaction, entries, buttonSize=32):
+        popup = self.popups.get(key)
+        if popup is not None and popup.reaction == reaction:
+            return
+        self.idle.post(('popup', key), lambda: self.build(key, reaction, entries, buttonSize, True), 1)
+
+    def build(self, key, reaction, entries, buttonSize=32, idle=False):
+        self.discard(key)
+        popup = self.popups[key] = ActionPopup(reaction, entries, self.iconCache, buttonSize, self.timers)
+        self.stats['prebuilt' if idle else 'built'] += 1
+        return popup
+
+    def popup(self, key, reaction, entries, buttonSize=32):
+        self.idle.take(('popup', key))
+        popup = self.popups.get(key)
+        if popup is not None and popup.reaction == reaction:
+            self.stats['hits'] += 1
+            return popup
+        return self.build(key, reaction, entries, buttonSize)
+
+    def dockerPopup(self, key, reaction):
+        popup = self.popups.get(key)
+        if popup is not None and popup.reaction == reaction:
+            self.stats['hits'] += 1
+            return popup
+        self.discard(key)
+        popup = self.popups[key] = DockerPopup(reaction, self.timers)
+        self.stats['built'] += 1
+        return popup
+
+    def discard(self, key):
+        self.idle.cancel(('popup', key))
+        popup = self.popups.pop(key, None)
+        # top level popups go with the application on shutdown
+        if popup is not None and not sip.isdeleted(popup):
+            popup.close()
+            popup.deleteLater()
+
+    def close(self, key):
+        popup = self.popups.get(key)
+        if popup is not None and not sip.isdeleted(popup):
+            popup.close()
+
+    def visible(self):
+        """Keys of the popups that are open."""
+        return { key for key, popup in self.popups.items() if not sip.isdeleted(popup) and popup.isVisible() }
+
+    def retain(self, keys):
+        for key in [ key for key in self.popups if key not in keys ]:
+            self.discard(key)
+
+    def latency(self):
+        """(opens, mean, max) open to paint latency over all popups."""
+        opens = sum( p.stats['opens'] for p in self.popups.values() )
+        total = sum( p.stats['latency'] for p in self.popups.values() )
+        worst = max( (p.stats['maxLatency'] for p in self.popups.values()), default=0.0 )
+        return (opens, total / opens if opens else 0.0, worst)
+
+    def clear(self):
+        for ruuid in list(self.popups):
+            self.discard(ruuid)
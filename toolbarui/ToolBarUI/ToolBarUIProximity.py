@@ -0,0 +1,147 @@
+import time
+from PyQt5.QtCore import QObject, QEvent, QTimer, pyqtSignal
+from PyQt5.QtGui import QCursor, QGuiApplication
+
+
+class ZoneIndex:
+    """Rectangles by key, bucketed on a grid so a point is only tested
+    against the few zones sharing its cell."""
+
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.buckets = {}
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def cells(self, rect):
+        c = self.cell
+        for x in range(rect.left() // c, rect.right() // c + 1):
+            for y in range(rect.top() // c, rect.bottom() // c + 1):
+                yield (x, y)
+
+    def insert(self, key, rect):
+        self.remove(key)
+        self.rects[key] = rect
+        for cell in self.cells(rect):
+            self.buckets.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self.cells(rect):
+            bucket = self.buckets[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[cell]
+
+    def query(self, point):
+        bucket = self.buckets.get( (point.x() // self.cell, point.y() // self.cell), () )
+        return { key for key in bucket if self.rects[key].contains(point) }
+
+
+class ProximityTracker(QObject):
+    """Tells when the pointer enters and leaves hot zones of the main
+    windows.
+
+    One event filter on the application watches pointer movement, and it
+    is only installed while there are zones. Movement is looked at no more
+    than once per display frame: the first event of a frame is handled
+    right away, the last one of a burst by a single shot timer, so nothing
+    runs while the pointer is still. Zones are in window coordinates,
+    a ZoneIndex per window.
+    """
+    entered = pyqtSignal(object)
+    left = pyqtSignal(object)
+    windowResized = pyqtSignal(object)
+
+    MOVES = frozenset( (QEvent.MouseMove, QEvent.HoverMove, QEvent.TabletMove, QEvent.Enter, QEvent.Leave) )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.windows = {}
+        self.zones = {}
+        self.active = set()
+        self.installed = False
+        self.last = 0.0
+        self.pending = False
+        self.interval = None
+        self.stats = { 'events':0, 'updates':0, 'deferred':0, 'time':0.0 }
+
+    def frameInterval(self):
+        if self.interval is None:
+            screen = QGuiApplication.primaryScreen()
+            rate = screen.refreshRate() if screen is not None else 0
+            self.interval = 1.0 / (rate if rate > 0 else 60.0)
+        return self.interval
+
+    def setZone(self, key, qwin, rect):
+        if key in self.zones and self.zones[key] is not qwin:
+            self.removeZone(key)
+        self.zones[key] = qwin
+        self.windows.setdefault(qwin, ZoneIndex()).insert(key, rect)
+        self.install(True)
+
+    def removeZone(self, key):
+        qwin = self.zones.pop(key, None)
+        if qwin is None:
+            return
+        index = self.windows[qwin]
+        index.remove(key)
+        if not index:
+            del self.windows[qwin]
+        self.active.discard(key)
+        self.install(bool(self.zones))
+
+    def removeWindow(self, qwin):
+        for key in [ key for key, w in self.zones.items() if w is qwin ]:
+            self.removeZone(key)
+
+    def install(self, on):
+        if on != self.installed:
+            app = QGuiApplication.instance()
+            if on:
+                app.installEventFilter(self)
+            else:
+                app.removeEventFilter(self)
+            self.installed = on
+
+    def eventFilter(self, obj, event):
+        t = event.type()
+        if t in self.MOVES:
+            self.stats['events'] += 1
+            self.moved()
+        elif t == QEvent.Resize and obj in self.windows:
+            self.windowResized.emit(obj)
+        return False
+
+    def moved(self):
+        if self.pending:
+            return
+        wait = self.last + self.frameInterval() - time.perf_counter()
+        if wait > 0:
+            self.pending = True
+            self.stats['deferred'] += 1
+            QTimer.singleShot(int(wait * 1000) + 1, self.update)
+        else:
+            self.update()
+
+    def update(self):
+        start = self.last = time.perf_counter()
+        self.pending = False
+        pos = QCursor.pos()
+        hits = set()
+        for qwin, index in self.windows.items():
+            if qwin.isVisible():
+                hits |= index.query( qwin.mapFromGlobal(pos) )
+
+        (left, entered) = (self.active - hits, hits - self.active)
+        self.active = hits
+        for key in left:
+            self.left.emit(key)
+        for key in entered:
+            self.entered.emit(key)
+        self.stats['updates'] += 1
+        self.stats['time'] += time.perf_counter() - start
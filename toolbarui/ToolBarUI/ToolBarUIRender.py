@@ -0,0 +1,168 @@
+import time
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QGuiApplication, QImageReader, QPixmap
+
+
+RENDER_BATCH = 16
+RENDER_FLUSH = 30
+
+
+def iconTheme():
+    """'dark' or 'light', the icon variant Krita uses with the current
+    palette: dark icons on a light window background."""
+    return 'dark' if QGuiApplication.palette().window().color().value() > 100 else 'light'
+
+
+def themeOf(path):
+    name = path.rsplit('/', 1)[-1].split('_', 1)
+    if name[0].isdigit() and len(name) > 1:
+        name = name[1].split('_', 1)
+    return name[0] if name[0] in ('dark', 'light') and len(name) > 1 else None
+
+
+def preferredPath(paths, theme=None):
+    """The resource a preview is best rendered from, skipping the variant
+    of the other theme: a scalable one if there is one, otherwise the last
+    (largest) bitmap."""
+    paths = [ path for path in paths if themeOf(path) in (None, theme) ] or paths
+    for path in paths:
+        if path.endswith(('.svg', '.svgz', '.svz')):
+            return path
+    return paths[-1] if paths else None
+
+
+def rasterize(path, size):
+    reader = QImageReader(path)
+    if path.endswith('.svz'):
+        reader.setFormat(b'svgz')
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(size, Qt.KeepAspectRatio))
+    image = reader.read()
+    return image if not image.isNull() else None
+
+
+class IconRenderTask(QRunnable):
+    def __init__(self, renderer, generation, jobs):
+        super().__init__()
+        self.renderer = renderer
+        self.generation = generation
+        self.jobs = jobs
+
+    def run(self):
+        start = time.perf_counter()
+        results = []
+        for (name, path) in self.jobs:
+            if self.generation != self.renderer.generation:
+                break
+            results.append( (name, rasterize(path, self.renderer.pixelSize)) )
+        self.renderer.deliver(self.generation, results, time.perf_counter() - start)
+
+
+class IconRenderer(QObject):
+    """Rasterizes icon resources into QImages on a thread pool.
+
+    request() queues a name, jobs are grouped in batches of RENDER_BATCH
+    and the finished images are collected on the GUI thread every
+    RENDER_FLUSH ms, converted to pixmaps and announced with rendered()
+    as (name, pixmap) pairs, pixmap being None if the resource could not
+    be read.
+    cancel() drops everything queued or in flight, e.g. when the filter
+    changes. Only QImage and QImageReader are used off the GUI thread, so
+    this also runs under the offscreen platform.
+    """
+    rendered = pyqtSignal(list)
+
+    def __init__(self, size=QSize(32,32), ratio=1.0, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool(self)
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.queued = []
+        self.pending = set()
+        self.results = []
+        self.setSize(size, ratio)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(RENDER_FLUSH)
+        self.timer.timeout.connect(self.collect)
+
+        self.stats = { 'rendered':0, 'failed':0, 'batches':0, 'cancelled':0, 'renderTime':0.0, 'wallTime':0.0 }
+        self.started = None
+
+    def setSize(self, size, ratio=1.0):
+        self.size = size
+        self.ratio = ratio
+        self.pixelSize = size * ratio
+
+    def request(self, name, path):
+        if name in self.pending or path is None:
+            return
+        self.pending.add(name)
+        self.queued.append( (name, path) )
+        if len(self.queued) >= RENDER_BATCH:
+            self.submit()
+        else:
+            QTimer.singleShot(0, self.submit)
+
+    def submit(self):
+        if not self.queued:
+            return
+        if self.started is None:
+            self.started = time.perf_counter()
+        for i in range(0, len(self.queued), RENDER_BATCH):
+            self.pool.start( IconRenderTask(self, self.generation, self.queued[i:i+RENDER_BATCH]) )
+            self.stats['batches'] += 1
+        self.queued = []
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def deliver(self, generation, results, elapsed):
+        # called from the worker threads
+        with self.lock:
+            self.stats['renderTime'] += elapsed
+            if generation == self.generation:
+                self.results.extend(results)
+
+    def collect(self):
+        with self.lock:
+            (results, self.results) = (self.results, [])
+
+        names = []
+        for (name, image) in results:
+            self.pending.discard(name)
+            if image is None:
+                self.stats['failed'] += 1
+                names.append( (name, None) )
+                continue
+            pixmap = QPixmap.fromImage(image)
+            pixmap.setDevicePixelRatio(self.ratio)
+            names.append( (name, pixmap) )
+            self.stats['rendered'] += 1
+
+        if not self.pending:
+            self.timer.stop()
+            if self.started is not None:
+                self.stats['wallTime'] += time.perf_counter() - self.started
+                self.started = None
+        if names:
+            self.rendered.emit(names)
+
+    def cancel(self):
+        self.pool.clear()
+        with self.lock:
+            self.generation += 1
+            self.results = []
+        self.stats['cancelled'] += len(self.pending)
+        self.queued = []
+        self.pending = set()
+
+    def wait(self, msecs=-1):
+        self.submit()
+        self.pool.waitForDone(msecs)
+        self.collect()
+
+    def throughput(self):
+        """Rendered icons per second of worker time, i.e. per core."""
+        return self.stats['rendered'] / self.stats['renderTime'] if self.stats['renderTime'] else 0.0
@@ -0,0 +1,172 @@
+import heapq
+import math
+import time
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
+
+
+class IdleQueue(QObject):
+    """Runs posted work when the event loop is idle.
+
+    Tasks are run by priority (lowest first, then in posting order) from a
+    zero interval timer, and each pass stops once budget seconds are used
+    so input and painting keep their turn. Posting again with the same key
+    replaces the pending task.
+    """
+    drained = pyqtSignal()
+
+    def __init__(self, budget=0.008, parent=None):
+        super().__init__(parent)
+        self.budget = budget
+        self.heap = []
+        self.tasks = {}
+        self.seq = 0
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.run)
+        self.stats = { 'tasks':0, 'passes':0, 'time':0.0 }
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __contains__(self, key):
+        return key in self.tasks
+
+    def post(self, key, func, priority=0):
+        self.seq += 1
+        self.tasks[key] = (self.seq, func)
+        heapq.heappush(self.heap, (priority, self.seq, key))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def cancel(self, key):
+        # the heap entry is skipped when it comes up
+        self.tasks.pop(key, None)
+
+    def take(self, key):
+        """Runs the task now, e.g. when its result is needed right away."""
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task[1]()
+            self.stats['tasks'] += 1
+
+    def run(self):
+        start = time.perf_counter()
+        self.stats['passes'] += 1
+        while self.heap and time.perf_counter() - start < self.budget:
+            (priority, seq, key) = heapq.heappop(self.heap)
+            task = self.tasks.get(key)
+            if task is None or task[0] != seq:
+                continue
+            del self.tasks[key]
+            task[1]()
+            self.stats['tasks'] += 1
+        self.stats['time'] += time.perf_counter() - start
+
+        if not self.tasks:
+            self.heap = []
+            self.timer.stop()
+            self.drained.emit()
+
+
+class TimerWheel:
+    """Hashed timer wheel for the delayed callbacks of all buttons.
+
+    Deadlines are rounded up to ticks and hashed into slots, so schedule()
+    and cancel() cost the same however many timers are pending, and a
+    tick only looks at its own slot. Scheduling a key that is pending
+    replaces it, which debounces repeated requests. The wheel has no
+    timer of its own: advance() runs what is due at the clock's current
+    time and is called by a WheelTimer, or directly with a fake clock.
+    """
+
+    def __init__(self, tick=0.01, slots=256, clock=time.monotonic):
+        self.tick = tick
+        self.slots = [ {} for i in range(slots) ]
+        self.clock = clock
+        # key -> (deadline tick, func)
+        self.timers = {}
+        self.current = self.ticks(clock())
+        self.stats = { 'scheduled':0, 'cancelled':0, 'fired':0, 'ticks':0 }
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def ticks(self, t):
+        return int(t / self.tick)
+
+    def schedule(self, key, delay, func):
+        """Runs func after delay seconds, unless cancelled before."""
+        self.cancel(key, False)
+        # never in the current slot, it may be being run
+        deadline = max(self.ticks(self.clock() + delay + self.tick - 1e-9), self.current + 1)
+        self.timers[key] = (deadline, func)
+        self.slots[deadline % len(self.slots)][key] = deadline
+        self.stats['scheduled'] += 1
+
+    def cancel(self, key, count=True):
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            del self.slots[timer[0] % len(self.slots)][key]
+            if count: self.stats['cancelled'] += 1
+
+    def advance(self):
+        now = self.ticks(self.clock())
+        # a long stall need not visit every tick, one round covers all slots
+        first = max(self.current + 1, now - len(self.slots) + 1)
+        for tick in range(first, now + 1):
+            slot = self.slots[tick % len(self.slots)]
+            due = [ key for key, deadline in slot.items() if deadline <= now ]
+            for key in due:
+                # a callback may have cancelled or rescheduled this key
+                timer = self.timers.get(key)
+                if timer is None or timer[0] > now:
+                    continue
+                self.cancel(key, False)
+                timer[1]()
+                self.stats['fired'] += 1
+            self.stats['ticks'] += 1
+        self.current = max(self.current, now)
+
+    def nextDeadline(self):
+        """Seconds until the earliest pending timer is due, None when none
+        is pending."""
+        if not self.timers:
+            return None
+        deadline = min( timer[0] for timer in self.timers.values() )
+        return max(0.0, deadline * self.tick - self.clock())
+
+
+class WheelTimer(QObject):
+    """Drives a TimerWheel with one single shot QTimer, set for the earliest
+    pending deadline and stopped while no timer is pending."""
+
+    def __init__(self, wheel, parent=None):
+        super().__init__(parent)
+        self.wheel = wheel
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.advance)
+
+    def schedule(self, key, delay, func):
+        self.wheel.schedule(key, delay, func)
+        self.restart()
+
+    def cancel(self, key):
+        # the timer is left running, with nothing due its timeout stops it;
+        # windows cancel theirs while the application shuts down
+        self.wheel.cancel(key)
+
+    def advance(self):
+        self.wheel.advance()
+        self.restart()
+
+    def restart(self):
+        delay = self.wheel.nextDeadline()
+        if delay is None:
+            self.timer.stop()
+        else:
+            self.timer.start(math.ceil(delay * 1000))
@@ -0,0 +1,193 @@
+import re
+import time
+from bisect import bisect_left
+
+
+WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+SCORE_EXACT = 100
+SCORE_PREFIX = 90
+SCORE_BOUNDARY = 80
+SCORE_INITIALS = 70
+SCORE_SUBSTRING = 60
+SCORE_FUZZY = 30
+
+FUZZY_BELOW = 50
+
+
+def words(text):
+    """Lowercase words of text, split on separators and camelCase."""
+    return [ w.lower() for w in WORD.findall(text) ]
+
+
+def trigrams(text):
+    return { text[i:i+3] for i in range(len(text) - 2) }
+
+
+class SearchField:
+    __slots__ = ('text', 'words', 'starts', 'initials', 'weight')
+
+    def __init__(self, text, weight):
+        self.text = text.lower()
+        self.words = words(text)
+        self.weight = weight
+        self.initials = ''.join( w[0] for w in self.words )
+        self.starts = set()
+        i = 0
+        for w in self.words:
+            i = self.text.find(w, i)
+            if i < 0: break
+            self.starts.add(i)
+            i += len(w)
+
+    def score(self, q):
+        text = self.text
+        if text == q:
+            return SCORE_EXACT
+        if text.startswith(q):
+            return SCORE_PREFIX
+        i = text.find(q)
+        if i >= 0:
+            while i >= 0:
+                if i in self.starts:
+                    return SCORE_BOUNDARY
+                i = text.find(q, i + 1)
+            return SCORE_SUBSTRING
+        if len(q) > 1 and self.initials.startswith(q):
+            return SCORE_INITIALS
+        return 0
+
+    def fuzzy(self, q):
+        # every character of q in order; the tighter the match, the better
+        text = self.text
+        first = pos = text.find(q[0])
+        if pos < 0: return 0
+        for c in q[1:]:
+            pos = text.find(c, pos + 1)
+            if pos < 0: return 0
+        return SCORE_FUZZY * len(q) / (pos - first + 1)
+
+
+class SearchIndex:
+    """Token and trigram index for the picker filters.
+
+    Documents are (key, [(text, weight), ...]). search() splits the query
+    in words and returns the keys matching every word, best first: exact,
+    prefix, word boundary (including camelCase and '_' separated words),
+    initials and plain substring matches come from the indexes, and when
+    they are few, in order character (fuzzy) matches are added. While a
+    query is being typed out only the documents that could still match
+    the previous one are looked at.
+    """
+
+    def __init__(self, documents):
+        self.keys = []
+        self.fields = []
+        self.texts = []
+        self.grams = {}
+        self.tokens = {}
+        for key, texts in documents:
+            self.add(key, [ SearchField(text, weight) for text, weight in texts if text ])
+        self.sortedTokens = sorted(self.tokens)
+        self.last = (None, None)
+        self.stats = { 'queries':0, 'time':0.0, 'maxTime':0.0, 'lastTime':0.0 }
+
+    def add(self, key, fields):
+        doc = len(self.keys)
+        self.keys.append(key)
+        self.fields.append(fields)
+        self.texts.append( '\n'.join( field.text for field in fields ) )
+        for field in fields:
+            for w in field.words + [field.initials]:
+                self.tokens.setdefault(w, set()).add(doc)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def postings(self, gram):
+        # trigram (and single character) postings are filled in on first use,
+        # the scan is a substring test per document
+        docs = self.grams.get(gram)
+        if docs is None:
+            docs = self.grams[gram] = { d for d, text in enumerate(self.texts) if gram in text }
+        return docs
+
+    def tokenPrefix(self, q):
+        docs = set()
+        i = bisect_left(self.sortedTokens, q)
+        while i < len(self.sortedTokens) and self.sortedTokens[i].startswith(q):
+            docs |= self.tokens[self.sortedTokens[i]]
+            i += 1
+        return docs
+
+    def candidates(self, q, pool):
+        if len(q) >= 3:
+            found = None
+            for g in trigrams(q):
+                docs = self.postings(g)
+                if not docs: break
+                found = docs if found is None else found & docs
+            return (set(found or ()) | self.tokenPrefix(q)) & pool
+        if len(q) == 2:
+            return (self.tokenPrefix(q) | self.postings(q)) & pool
+        # a single character matches at the start of words, or anywhere if
+        # it starts none
+        return (self.tokenPrefix(q) & pool) or pool
+
+    def pool(self, q, within):
+        # documents containing every character of q, a superset of any match
+        found = within
+        for c in set(q):
+            docs = self.postings(c)
+            if not docs: return set()
+            found = docs if found is None else found & docs
+        return set(found)
+
+    def search(self, query):
+        """Keys matching query, best first; all keys for an empty query."""
+        start = time.perf_counter()
+        terms = words(query) if query.strip() else []
+        if not terms:
+            return list(self.keys)
+
+        # while a word is being typed out its pool can only shrink
+        (lastTerms, lastPools) = self.last
+        pools = []
+        scores = None
+        for i, q in enumerate(terms):
+            within = None
+            if lastTerms and i < len(lastTerms) and q.startswith(lastTerms[i]):
+                within = lastPools[i]
+            pool = self.pool(q, within)
+            pools.append(pool)
+            if scores is not None:
+                pool = pool & scores.keys()
+
+            termScores = {}
+            for d in self.candidates(q, pool):
+                s = max( (f.score(q) * f.weight for f in self.fields[d]), default=0 )
+                if s: termScores[d] = s
+            if len(termScores) < FUZZY_BELOW and len(q) > 1:
+                for d in pool - termScores.keys():
+                    s = max( (f.fuzzy(q) * f.weight for f in self.fields[d]), default=0 )
+                    if s: termScores[d] = s
+            if scores is None:
+                scores = termScores
+            else:
+                scores = { d:s + termScores[d] for d, s in scores.items() if d in termScores }
+
+        # the query as typed, e.g. a shortcut or words in order, ranks first
+        if len(terms) > 1:
+            whole = query.strip().lower()
+            for d in scores:
+                scores[d] += max( (f.score(whole) * f.weight for f in self.fields[d]), default=0 )
+
+        self.last = (terms, pools)
+        result = [ self.keys[d] for d in sorted(scores, key=lambda d: (-scores[d], len(self.fields[d][0].text), d)) ]
+
+        elapsed = time.perf_counter() - start
+        self.stats['queries'] += 1
+        self.stats['time'] += elapsed
+        self.stats['lastTime'] = elapsed
+        self.stats['maxTime'] = max(self.stats['maxTime'], elapsed)
+        return result
@@ -0,0 +1,443 @@
+import os
+import json
+import time
+import functools
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from PyQt5.QtCore import QCoreApplication, QEvent, QObject, QTimer, QThreadPool, QRunnable, pyqtSignal, pyqtSlot
+
+
+SCHEMA_VERSION = 1
+
+GROUP = 'pluginToolBarUI'
+INDEX = 'index'
+LEGACY = None
+
+
+class SettingsError(ValueError):
+    pass
+
+
+def toolbarKey(uuid):
+    return 'toolbar_' + uuid
+
+
+def emptyToolbar(uuid):
+    return {
+        'config':{
+            'toolbarName': "ToolBar "+uuid
+            },
+        'top':{
+            'items':[]
+            },
+        'bottom':{
+            'items':[]
+            }
+        }
+
+
+MIGRATIONS = {}
+
+def migration(kind, version):
+    """Register a step upgrading a 'kind' record from version to version+1."""
+    def register(step):
+        MIGRATIONS[(kind, version)] = step
+        return step
+    return register
+
+def migrate(kind, record):
+    version = int(record.get('version', 0))
+    if version > SCHEMA_VERSION:
+        raise SettingsError(kind + ' record has schema version ' + str(version) + ', newer than ' + str(SCHEMA_VERSION))
+    while version < SCHEMA_VERSION:
+        if (kind, version) not in MIGRATIONS:
+            raise SettingsError('no migration for ' + kind + ' records from version ' + str(version))
+        record = MIGRATIONS[(kind, version)](record)
+        version += 1
+        record['version'] = version
+    return record
+
+
+@migration('settings', 0)
+def migrateSettings0(record):
+    # the single 'pluginToolBarUI' blob (versions 0 and 0.001); its shape is
+    # kept as is, only the storage is split up, see SettingsStore.load
+    record.setdefault('count', 0)
+    record.setdefault('config', {})
+    record.setdefault('toolbars', {})
+    return record
+
+
+class SettingsBackend(ABC):
+    """Where the settings records are stored.
+
+    read() returns '' for a missing record, key LEGACY is the pre-sharding
+    single blob.
+    """
+    @abstractmethod
+    def read(self, key):
+        pass
+
+    @abstractmethod
+    def write(self, key, value):
+        pass
+
+
+class KritaSettingsBackend(SettingsBackend):
+    def __init__(self):
+        from krita import Krita
+        self.krita = Krita.instance()
+
+    def read(self, key):
+        if key is LEGACY:
+            return self.krita.readSetting("", GROUP, "")
+        return self.krita.readSetting(GROUP, key, "")
+
+    def write(self, key, value):
+        if key is LEGACY:
+            self.krita.writeSetting("", GROUP, value)
+        else:
+            self.krita.writeSetting(GROUP, key, value)
+
+
+class MemorySettingsBackend(SettingsBackend):
+    def __init__(self, records=None):
+        self.records = dict(records or {})
+
+    def read(self, key):
+        return self.records.get(key, '')
+
+    def write(self, key, value):
+        self.records[key] = value
+
+
+class FileSettingsBackend(SettingsBackend):
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def filename(self, key):
+        return os.path.join(self.path, (GROUP if key is LEGACY else key) + '.json')
+
+    def read(self, key):
+        try:
+            with open(self.filename(key)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return ''
+
+    def write(self, key, value):
+        with open(self.filename(key), 'w') as f:
+            f.write(value)
+
+
+class LazyToolbars(MutableMapping):
+    """The 'toolbars' dict of the settings, parsed one record at a time.
+
+    Records are only read and parsed when a toolbar is first accessed, the
+    names are kept in the index so the config lists don't need to.
+    """
+    def __init__(self, store, names):
+        self.store = store
+        self.names = dict(names)
+        self.parsed = {}
+
+    def __getitem__(self, uuid):
+        if uuid not in self.parsed:
+            if uuid not in self.names:
+                raise KeyError(uuid)
+            self.parsed[uuid] = self.store.loadToolbar(uuid)
+        return self.parsed[uuid]
+
+    def __setitem__(self, uuid, value):
+        self.parsed[uuid] = value
+        self.names[uuid] = value['config'].get('toolbarName', uuid)
+
+    def __delitem__(self, uuid):
+        del self.names[uuid]
+        self.parsed.pop(uuid, None)
+
+    def __iter__(self):
+        return iter(list(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, uuid):
+        return uuid in self.names
+
+    def name(self, uuid):
+        if uuid in self.parsed:
+            return self.parsed[uuid]['config'].get('toolbarName', uuid)
+        return self.names[uuid]
+
+    def loader(self, uuid):
+        """A callable giving the parsed record of a toolbar that hasn't been
+        loaded yet, None when it already has been."""
+        if uuid in self.parsed:
+            return None
+        return functools.partial(self.store.loadToolbar, uuid)
+
+
+class SettingsStore:
+    """Versioned settings kept as one index record plus one record per toolbar.
+
+    With a RecoveryFile, records that are missing or corrupt in the back end
+    are restored from the last good copy written by the SettingsWriter.
+    """
+
+    def __init__(self, backend, recovery=None):
+        self.backend = backend
+        self.recovery = recovery
+
+    def read(self, key):
+        data = self.backend.read(key)
+        if self.recovery is not None and not self.valid(data):
+            saved = self.recovery.load().get(key, '')
+            if self.valid(saved):
+                print ("ToolBarUI: restored settings record", key, "from", self.recovery.path)
+                self.backend.write(key, saved)
+                return saved
+        return data
+
+    @staticmethod
+    def valid(data):
+        # cheap check for a missing or torn record, a full parse follows anyway
+        return data.startswith('{') and data.rstrip().endswith('}')
+
+    def parse(self, key, data, parse):
+        """parse(data), falling back to the recovery copy of the record when
+        it isn't valid json. A record of a newer schema is not replaced."""
+        try:
+            return parse(data)
+        except SettingsError:
+            raise
+        except ValueError as e:
+            saved = self.recovery.load().get(key, '') if self.recovery is not None else ''
+            if not self.valid(saved) or saved == data:
+                raise
+            try:
+                result = parse(saved)
+            except ValueError:
+                raise e
+            print ("ToolBarUI: restored settings record", key, "from", self.recovery.path)
+            self.backend.write(key, saved)
+            return result
+
+    def load(self):
+        data = self.read(INDEX)
+        if data.startswith('{'):
+            index = self.parse(INDEX, data, lambda data: migrate('index', json.loads(data)))
+        else:
+            index = self.upgradeLegacy()
+
+        return {
+            'version':SCHEMA_VERSION,
+            'count':index.get('count', 0),
+            'config':index.get('config', {}),
+            'toolbars':LazyToolbars(self, index.get('toolbars', []))
+            }
+
+    def upgradeLegacy(self):
+        data = self.backend.read(LEGACY)
+        settings = migrate('settings', json.loads(data) if data.startswith('{') else {})
+
+        # the legacy blob is left in place, as a backup of the old layout
+        for tuuid, tv in settings['toolbars'].items():
+            self.backend.write(toolbarKey(tuuid), self.dumpToolbar(tv))
+        index = self.indexRecord(settings['count'], settings['config'], [ (tuuid, tv['config'].get('toolbarName', tuuid)) for tuuid, tv in settings['toolbars'].items() ])
+        if settings['toolbars'] or settings['config']:
+            self.backend.write(INDEX, json.dumps(index))
+        return index
+
+    def loadToolbar(self, uuid):
+        return self.parse(toolbarKey(uuid), self.read(toolbarKey(uuid)), functools.partial(self.parseToolbar, uuid))
+
+    def parseToolbar(self, uuid, data):
+        if not data.startswith('{'):
+            print ("ToolBarUI: missing settings record for toolbar", uuid)
+            return emptyToolbar(uuid)
+        return migrate('toolbar', json.loads(data))['toolbar']
+
+    def dumpToolbar(self, toolbar):
+        return json.dumps({ 'version':SCHEMA_VERSION, 'toolbar':toolbar })
+
+    def indexRecord(self, count, config, names):
+        return {
+            'version':SCHEMA_VERSION,
+            'count':count,
+            'config':config,
+            'toolbars':[ [tuuid, name] for tuuid, name in names ]
+            }
+
+    def snapshot(self, settings, layout, tags):
+        """What a save needs, taken on the GUI thread without serializing:
+        the compiled layout is immutable so it can be dumped elsewhere."""
+        toolbars = settings['toolbars']
+        return (layout, frozenset(tags), [ (tuuid, toolbars.name(tuuid)) for tuuid in toolbars ], settings.get('count', 0))
+
+    def records(self, snapshot):
+        """The (key, serialized record) pairs for a snapshot: the changed
+        toolbars ('' for removed ones) and the index."""
+        (layout, tags, names, count) = snapshot
+        records = []
+        for tag in tags:
+            if tag == 'config': continue
+            records.append( (toolbarKey(tag), self.dumpToolbar(layout.toolbars[tag].toJson()) if tag in layout.toolbars else '') )
+        if tags:
+            records.append( (INDEX, json.dumps(self.indexRecord(count, dict(layout.config), names))) )
+        return records
+
+    def rawRecords(self, settings):
+        records = [ (INDEX, self.backend.read(INDEX)) ]
+        for tuuid in settings['toolbars']:
+            records.append( (toolbarKey(tuuid), self.backend.read(toolbarKey(tuuid))) )
+        return records
+
+    def save(self, settings, layout, tags):
+        for (key, value) in self.records(self.snapshot(settings, layout, tags)):
+            self.backend.write(key, value)
+
+
+class RecoveryFile:
+    """Last good copy of the settings records, next to the Krita settings.
+
+    Every save is appended to a journal file as one json line and flushed
+    to disk; after compactAfter saves the records are rewritten to the
+    snapshot file through a temp file and an atomic rename. Loading reads
+    the snapshot and replays the journal, ignoring a torn last line.
+    """
+
+    def __init__(self, path, compactAfter=32):
+        self.path = path
+        self.compactAfter = compactAfter
+        self.records = None
+        self.entries = 0
+
+    def exists(self):
+        return os.path.exists(self.path + '.json')
+
+    def load(self):
+        if self.records is None:
+            self.records = {}
+            self.entries = 0
+            try:
+                with open(self.path + '.json') as f:
+                    self.records = json.load(f)
+            except (OSError, ValueError):
+                pass
+            try:
+                with open(self.path + '.journal') as f:
+                    for line in f:
+                        try:
+                            self.records.update(json.loads(line))
+                        except ValueError:
+                            break
+                        self.entries += 1
+            except OSError:
+                pass
+        return self.records
+
+    def append(self, records):
+        self.load()
+        self.records.update(records)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.journal', 'a') as f:
+            f.write(json.dumps(dict(records)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += 1
+        if self.entries >= self.compactAfter or not self.exists():
+            self.compact()
+
+    def compact(self):
+        with open(self.path + '.json.tmp', 'w') as f:
+            json.dump(self.records, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + '.json.tmp', self.path + '.json')
+        open(self.path + '.journal', 'w').close()
+        self.entries = 0
+
+
+class SettingsWriteTask(QRunnable):
+    def __init__(self, writer, snapshot, base):
+        super().__init__()
+        self.writer = writer
+        self.snapshot = snapshot
+        self.base = base
+
+    def run(self):
+        start = time.perf_counter()
+        records = self.writer.store.records(self.snapshot)
+        if self.writer.recovery is not None:
+            try:
+                if self.base:
+                    self.writer.recovery.load()
+                    self.writer.recovery.records.update(dict(self.base))
+                self.writer.recovery.append(records)
+            except OSError as e:
+                print ("ToolBarUI: could not write", self.writer.recovery.path, e)
+        self.writer.serialized.emit(records, time.perf_counter() - start)
+
+
+class SettingsWriter(QObject):
+    """Coalesces saves and serializes them off the GUI thread.
+
+    schedule() only takes a snapshot and (re)starts a short timer, so a
+    burst of changes ends up as one write. The records are dumped and
+    appended to the RecoveryFile on a single worker thread, then handed
+    back to the GUI thread to be stored in the Krita settings.
+    """
+    serialized = pyqtSignal(object, float)
+
+    def __init__(self, store, recovery=None, delay=250, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.recovery = recovery
+        self.pending = None
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+        self.serialized.connect(self.apply)
+        self.stats = { 'scheduled':0, 'writes':0, 'guiTime':0.0, 'workerTime':0.0 }
+
+    def schedule(self, settings, layout, tags):
+        start = time.perf_counter()
+        tags = set(tags)
+        if self.pending is not None:
+            tags |= self.pending[1]
+        snapshot = self.store.snapshot(settings, layout, tags)
+        base = None
+        if self.recovery is not None and self.pending is None and not self.recovery.exists():
+            base = self.store.rawRecords(settings)
+        elif self.pending is not None:
+            base = self.pending[2]
+        self.pending = (snapshot, tags, base)
+        self.timer.start()
+        self.stats['scheduled'] += 1
+        self.stats['guiTime'] = time.perf_counter() - start
+
+    def flush(self, wait=False):
+        self.timer.stop()
+        if self.pending is not None:
+            (snapshot, tags, base) = self.pending
+            self.pending = None
+            self.pool.start(SettingsWriteTask(self, snapshot, base))
+        if wait:
+            self.pool.waitForDone()
+            # the records are handed back through a queued signal, store
+            # them now, there may be no event loop left to deliver it
+            QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
+
+    @pyqtSlot(object, float)
+    def apply(self, records, workerTime):
+        start = time.perf_counter()
+        for (key, value) in records:
+            self.store.backend.write(key, value)
+        self.stats['writes'] += 1
+        self.stats['workerTime'] = workerTime
+        self.stats['guiTime'] += time.perf_counter() - start
@@ -0,0 +1,74 @@
+import weakref
+import functools
+from PyQt5.QtCore import QObject, QTimer
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
+
+
+class ActionStateHub(QObject):
+    """Mirrors the checked state of QActions onto the buttons showing them.
+
+    Each action gets one toggled connection however many buttons subscribe
+    to it, and it is dropped with the last subscriber. Subscribers are held
+    weakly. Toggles are collected and delivered once per event loop pass
+    with the action's current state, so a burst of toggles ends in a
+    single update of each button.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.actions = {}
+        self.pending = set()
+        self.scheduled = False
+        self.stats = { 'toggles':0, 'deliveries':0, 'flushes':0 }
+
+    def connections(self):
+        return len(self.actions)
+
+    def subscribe(self, action, subscriber):
+        entry = self.actions.get(action)
+        if entry is None:
+            connection = action.toggled.connect( functools.partial(self.toggled, action) )
+            entry = self.actions[action] = (connection, weakref.WeakSet())
+        entry[1].add(subscriber)
+        subscriber.actionChanged(action.isChecked())
+
+    def unsubscribe(self, action, subscriber):
+        entry = self.actions.get(action)
+        if entry is None:
+            return
+        entry[1].discard(subscriber)
+        if not entry[1]:
+            self.drop(action)
+
+    def drop(self, action):
+        (connection, subscribers) = self.actions.pop(action)
+        if not sip.isdeleted(action):
+            QObject.disconnect(connection)
+        self.pending.discard(action)
+
+    def toggled(self, action, status):
+        self.stats['toggles'] += 1
+        self.pending.add(action)
+        if not self.scheduled:
+            self.scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        self.scheduled = False
+        self.stats['flushes'] += 1
+        (pending, self.pending) = (self.pending, set())
+        for action in pending:
+            entry = self.actions.get(action)
+            if entry is None:
+                continue
+            if sip.isdeleted(action):
+                self.drop(action)
+                continue
+            status = action.isChecked()
+            for subscriber in list(entry[1]):
+                if not sip.isdeleted(subscriber):
+                    subscriber.actionChanged(status)
+                    self.stats['deliveries'] += 1